@@ -0,0 +1,193 @@
+"""End-to-end throughput from TimeSimulation to the dashboard Lines model
+
+Runs the simulation's producers and the dashboard's consumers in one process against the
+in-memory broker of benchmarks/memory_broker.py, and the weather REST path against the
+stand-in of benchmarks/local_services.py, so no Kafka, Schema Registry or REST Proxy is
+needed. The stations table that Faust would build is seeded from the CTA station list.
+After every simulation tick the consumers drain their topics into Lines, and the
+benchmark reports arrival events per second delivered to the dashboard model.
+
+Run from the prj1 directory:
+
+    python benchmarks/end_to_end.py --ticks 500
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+from pathlib import Path
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, f"{Path(__file__).parents[0]}")
+sys.path.insert(0, f"{Path(__file__).parents[1]}/producers")
+
+from local_services import LocalServices
+from memory_broker import MemoryBroker, MemoryTransport
+
+from clock import SimulationClock
+from models import Weather
+from models.producer import ProducerPool
+from simulation import TimeSimulation
+
+# The consumers have their own top-level models package, so the producers' one is
+# unloaded before importing it. Objects already imported above keep working
+for module_name in [name for name in sys.modules if name.split(".")[0] == "models"]:
+    del sys.modules[module_name]
+sys.path.insert(0, f"{Path(__file__).parents[1]}/consumers")
+
+from consumer import KafkaConsumer, MultiplexConsumer, Route
+from models import Lines
+
+
+STATIONS_TABLE = "org.chicago.cta.stations.table.v1"
+
+
+def seed_stations_table(broker, stations_df):
+    """Writes the records faust_stream.py would produce for every station row"""
+    for _, station in stations_df.iterrows():
+        line = next((c for c in ("red", "blue", "green") if station[c]), "")
+        record = {
+            "station_id": int(station["station_id"]),
+            "station_name": station["station_name"],
+            "order": int(station["order"]),
+            "line": line,
+        }
+        broker.append(STATIONS_TABLE, 0, None, json.dumps(record))
+
+
+def drain(consumers):
+    """Consumes until every consumer has caught up, returning the messages handled"""
+    handled = 0
+    for consumer in consumers:
+        num_messages = consumer._consume()
+        while num_messages > 0:
+            handled += num_messages
+            num_messages = consumer._consume()
+    return handled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=500)
+    parser.add_argument("--aggregate-turnstiles", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=100, help="consumer batch size")
+    parser.add_argument(
+        "--multiplex", action="store_true", help="consume every topic with one MultiplexConsumer"
+    )
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    broker = MemoryBroker()
+    ProducerPool.transport = MemoryTransport(broker)
+    KafkaConsumer.transport = MemoryTransport(broker)
+    services = LocalServices().start()
+    Weather.rest_proxy_url = services.url
+
+    simulation = TimeSimulation(aggregate_turnstiles=args.aggregate_turnstiles)
+    # Seed the turnstile and weather randomness so runs produce the same messages
+    random.seed(0)
+    for i, line in enumerate(simulation.train_lines):
+        line.turnstile_bank.rng = np.random.default_rng(i)
+    start_time = datetime.datetime(2019, 1, 7)
+    simulation.weather = Weather(start_time.month, batch_size=Weather.fast_batch_size)
+    seed_stations_table(broker, simulation.raw_df)
+
+    # Every message is already on the broker when the consumers drain, so they do not
+    # wait on empty polls
+    lines = Lines()
+    if args.multiplex:
+        consumers = [
+            MultiplexConsumer(
+                "org.chicago.cta.dashboard",
+                [
+                    Route(
+                        STATIONS_TABLE,
+                        lines.process_message,
+                        lines.process_messages,
+                        is_avro=False,
+                        offset_earliest=True,
+                    ),
+                    Route(
+                        "^org.chicago.cta.station.arrivals.",
+                        lines.process_message,
+                        lines.process_messages,
+                        offset_earliest=True,
+                    ),
+                ],
+                consume_timeout=0,
+                batch_size=args.batch_size,
+            )
+        ]
+    else:
+        consumers = [
+            KafkaConsumer(
+                STATIONS_TABLE,
+                lines.process_message,
+                is_avro=False,
+                offset_earliest=True,
+                consume_timeout=0,
+                batch_size=args.batch_size,
+                batch_handler=lines.process_messages,
+            ),
+            KafkaConsumer(
+                "^org.chicago.cta.station.arrivals.",
+                lines.process_message,
+                offset_earliest=True,
+                consume_timeout=0,
+                batch_size=args.batch_size,
+                batch_handler=lines.process_messages,
+            ),
+        ]
+    drain(consumers[:1])
+
+    consumed = 0
+
+    def tick(curr_time):
+        nonlocal consumed
+        simulation._tick(curr_time)
+        consumed += drain(consumers)
+
+    clock = SimulationClock(
+        start_time,
+        simulation.time_step,
+        simulation.sleep_seconds,
+        mode=SimulationClock.modes.replay,
+        log_every=0,
+    )
+    started = time.perf_counter()
+    asyncio.run(clock.run(tick, max_ticks=args.ticks))
+    secs = time.perf_counter() - started
+
+    produced = {
+        topic: sum(len(partition) for partition in partitions)
+        for topic, partitions in broker.topics.items()
+    }
+    arrivals = sum(n for topic, n in produced.items() if ".arrivals." in topic)
+    trains_shown = sum(
+        (station.train_a is not None) + (station.train_b is not None)
+        for line in (lines.red_line, lines.green_line, lines.blue_line)
+        for station in line.stations.values()
+    )
+
+    simulation.weather.close()
+    for line in simulation.train_lines:
+        line.close()
+    services.stop()
+
+    print(f"ticks:               {args.ticks}")
+    print(f"messages produced:   {sum(produced.values())}")
+    print(f"arrivals produced:   {arrivals}")
+    print(f"messages consumed:   {consumed}")
+    print(f"trains on dashboard: {trains_shown}")
+    print(f"elapsed:             {secs:8.3f}s")
+    print(f"produced per second: {sum(produced.values()) / secs:10,.0f}")
+    print(f"consumed per second: {consumed / secs:10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
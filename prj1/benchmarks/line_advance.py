@@ -0,0 +1,188 @@
+"""Benchmark for advancing every train of a line by one station
+
+Compares the station scans Line._advance_trains used to perform to find each next train
+against the train position index it keeps now. Stations are in-process stand-ins, so no
+broker needs to be running.
+
+By default it runs a CTA-sized line, a sparse long line and two busy synthetic lines;
+--trains and --stations run a single line instead. Every line checks that both approaches
+emit the same arrival events, so trains must be spaced at least two stops apart: on more
+crowded lines the scans let a train overwrite the one just ahead of it.
+
+The scans already visit every station only about once per tick, so the index does not
+change the order of the work on busy lines; it skips the empty stations between trains,
+which pays off most on long, sparse lines.
+
+Run from the prj1 directory:
+
+    python benchmarks/line_advance.py --ticks 1000
+    python benchmarks/line_advance.py --trains 100 --stations 300
+"""
+import argparse
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, f"{Path(__file__).parents[1]}/producers")
+
+from models.line import Line
+
+
+class LocalStation:
+    """Records arrivals in place of a Station, without producing them to Kafka"""
+
+    def __init__(self, station_id, events):
+        self.station_id = station_id
+        self.events = events
+        self.a_train = None
+        self.b_train = None
+
+    def arrive_a(self, train, prev_station_id, prev_direction):
+        self.a_train = train
+        self.events.append(
+            (self.station_id, "a", train.train_id, prev_station_id, prev_direction)
+        )
+
+    def arrive_b(self, train, prev_station_id, prev_direction):
+        self.b_train = train
+        self.events.append(
+            (self.station_id, "b", train.train_id, prev_station_id, prev_direction)
+        )
+
+
+class ScanLine(Line):
+    """The original approach: scans the stations from each train to find the next one"""
+
+    def _advance_trains(self):
+        curr_train, curr_index, b_direction = self._next_train()
+        self.stations[curr_index].b_train = None
+
+        trains_advanced = 0
+        while trains_advanced < self.num_trains - 1:
+            if b_direction is True:
+                self.stations[curr_index].b_train = None
+            else:
+                self.stations[curr_index].a_train = None
+
+            prev_station = self.stations[curr_index].station_id
+            prev_dir = "b" if b_direction else "a"
+
+            curr_index, b_direction = self._get_next_idx(
+                curr_index, b_direction, step_size=1
+            )
+            if b_direction is True:
+                self.stations[curr_index].arrive_b(curr_train, prev_station, prev_dir)
+            else:
+                self.stations[curr_index].arrive_a(curr_train, prev_station, prev_dir)
+
+            move = 1 if b_direction else -1
+            curr_train, curr_index, b_direction = self._next_train(
+                curr_index + move, b_direction
+            )
+            trains_advanced += 1
+
+        if b_direction is True:
+            self.stations[curr_index].b_train = None
+        else:
+            self.stations[curr_index].a_train = None
+
+        prev_station = self.stations[curr_index].station_id
+        prev_dir = "b" if b_direction else "a"
+        curr_index, b_direction = self._get_next_idx(
+            curr_index, b_direction, step_size=1
+        )
+        if b_direction is True:
+            self.stations[curr_index].arrive_b(curr_train, prev_station, prev_dir)
+        else:
+            self.stations[curr_index].arrive_a(curr_train, prev_station, prev_dir)
+
+    def _next_train(self, start_index=0, b_direction=True, step_size=1):
+        if b_direction is True:
+            curr_index = self._next_train_b(start_index, step_size)
+            if curr_index == -1:
+                curr_index = self._next_train_a(len(self.stations) - 1, step_size)
+                b_direction = False
+        else:
+            curr_index = self._next_train_a(start_index, step_size)
+            if curr_index == -1:
+                curr_index = self._next_train_b(0, step_size)
+                b_direction = True
+
+        if b_direction is True:
+            return self.stations[curr_index].b_train, curr_index, True
+        return self.stations[curr_index].a_train, curr_index, False
+
+    def _next_train_b(self, start_index, step_size):
+        for i in range(start_index, len(self.stations), step_size):
+            if self.stations[i].b_train is not None:
+                return i
+        return -1
+
+    def _next_train_a(self, start_index, step_size):
+        for i in range(start_index, 0, -step_size):
+            if self.stations[i].a_train is not None:
+                return i
+        return -1
+
+
+def build_line(line_class, num_stations, num_trains):
+    """Builds a line of local stations, bypassing the Kafka producers of Line.__init__"""
+    line = line_class.__new__(line_class)
+    line.color = Line.colors.blue
+    line.num_trains = num_trains
+    line.events = []
+    line.stations = [LocalStation(i, line.events) for i in range(num_stations)]
+    line.num_stations = num_stations - 1
+    line.train_positions = []
+    line.trains = line._build_trains()
+    return line
+
+
+def bench(line, num_ticks):
+    """Returns the seconds taken to advance the line's trains num_ticks times"""
+    line.events.clear()
+    start = time.perf_counter()
+    for _ in range(num_ticks):
+        line._advance_trains()
+    return time.perf_counter() - start
+
+
+# (trains, stations) of the default lines
+LINES = [(10, 33), (10, 1001), (100, 300), (1000, 2001)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trains", type=int)
+    parser.add_argument("--stations", type=int)
+    parser.add_argument("--ticks", type=int, default=200)
+    args = parser.parse_args()
+
+    lines = LINES
+    if args.trains is not None or args.stations is not None:
+        lines = [(args.trains or 10, args.stations or 1001)]
+
+    for num_trains, num_stations in lines:
+        if num_trains > num_stations - 1:
+            raise SystemExit(
+                f"{num_trains} trains on {num_stations} stations are too crowded to compare"
+            )
+
+    print(f"ticks: {args.ticks}")
+    print(f"{'trains':>8} {'stations':>9} {'scans':>9} {'index':>9} {'speedup':>8}")
+    for num_trains, num_stations in lines:
+        scan_line = build_line(ScanLine, num_stations, num_trains)
+        index_line = build_line(Line, num_stations, num_trains)
+
+        scan_secs = bench(scan_line, args.ticks)
+        index_secs = bench(index_line, args.ticks)
+        if scan_line.events != index_line.events:
+            raise SystemExit("the two approaches emitted different arrival events")
+
+        print(
+            f"{num_trains:8} {num_stations:9} {scan_secs:8.3f}s {index_secs:8.3f}s"
+            f" {scan_secs / index_secs:7.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
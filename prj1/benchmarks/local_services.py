@@ -0,0 +1,217 @@
+"""In-process stand-in for the REST Proxy and Kafka Connect endpoints the producers use
+
+Implements the subset of the REST Proxy v2 and Kafka Connect REST APIs that
+models/weather.py and connector.py call, keeping topics and connectors in memory. Every
+request is recorded with its latency and payload sizes.
+
+Start it on the default REST Proxy and Kafka Connect ports, for example to run the
+simulation's REST paths without Confluent:
+
+    python benchmarks/local_services.py
+"""
+import argparse
+import collections
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class RequestLog:
+    """Latency and payload sizes of the requests served, by endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = collections.defaultdict(list)
+
+    def record(self, endpoint, latency, request_bytes, response_bytes):
+        with self._lock:
+            self.requests[endpoint].append((latency, request_bytes, response_bytes))
+
+    def clear(self):
+        with self._lock:
+            self.requests.clear()
+
+    def stats(self):
+        """Returns request counts, latencies in seconds and payload bytes by endpoint"""
+        with self._lock:
+            stats = {}
+            for endpoint, requests in self.requests.items():
+                latencies = sorted(latency for latency, _, _ in requests)
+                stats[endpoint] = {
+                    "requests": len(requests),
+                    "mean_latency": sum(latencies) / len(latencies),
+                    "p99_latency": latencies[int(0.99 * (len(latencies) - 1))],
+                    "request_bytes": sum(size for _, size, _ in requests),
+                    "response_bytes": sum(size for _, _, size in requests),
+                }
+            return stats
+
+
+class LocalServices(ThreadingMixIn, HTTPServer):
+    """Serves the REST Proxy and Kafka Connect endpoints from a single HTTP server"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), LocalServicesHandler)
+        self.log = RequestLog()
+        self._lock = threading.Lock()
+        # topic name -> number of records produced to it
+        self.topics = collections.Counter()
+        # schema string -> id, shared by keys and values like the Schema Registry
+        self.schema_ids = {}
+        self.connectors = {}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serves requests on a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_connectors(self):
+        """Forgets every connector, so the next configure creates it again"""
+        with self._lock:
+            self.connectors.clear()
+
+    def schema_id(self, schema):
+        with self._lock:
+            return self.schema_ids.setdefault(schema, len(self.schema_ids) + 1)
+
+    def known_schema_ids(self):
+        with self._lock:
+            return set(self.schema_ids.values())
+
+    def produce(self, topic, body):
+        """Handles POST /topics/<topic>, returning the status and response body"""
+        ids = {}
+        for field in ("key", "value"):
+            schema_id = body.get(f"{field}_schema_id")
+            if schema_id is None:
+                if f"{field}_schema" not in body:
+                    return 422, {"error_code": 42202, "message": f"{field} schema missing"}
+                schema_id = self.schema_id(body[f"{field}_schema"])
+            elif schema_id not in self.known_schema_ids():
+                return 404, {"error_code": 40403, "message": "Schema not found"}
+            ids[f"{field}_schema_id"] = schema_id
+
+        records = body.get("records", [])
+        with self._lock:
+            first_offset = self.topics[topic]
+            self.topics[topic] += len(records)
+        offsets = [
+            {"partition": 0, "offset": first_offset + i, "error_code": None, "error": None}
+            for i in range(len(records))
+        ]
+        return 200, dict(ids, offsets=offsets)
+
+    def connector(self, method, name, body):
+        """Handles the /connectors endpoints, returning the status and response body"""
+        with self._lock:
+            if name is None and method == "GET":
+                return 200, sorted(self.connectors)
+            if name is None and method == "POST":
+                if body["name"] in self.connectors:
+                    return 409, {"error_code": 409, "message": "Connector already exists"}
+                connector = dict(body, tasks=[], type="source")
+                self.connectors[body["name"]] = connector
+                return 201, connector
+            if name not in self.connectors:
+                return 404, {"error_code": 404, "message": f"Connector {name} not found"}
+            if method == "GET":
+                return 200, self.connectors[name]
+            if method == "DELETE":
+                del self.connectors[name]
+                return 204, None
+        return 405, {"error_code": 405, "message": "Method not allowed"}
+
+
+class LocalServicesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which would otherwise wait on delayed acks
+    disable_nagle_algorithm = True
+
+    topic_path = re.compile(r"^/topics/(?P<topic>[^/]+)$")
+    connector_path = re.compile(r"^/connectors(?:/(?P<name>[^/]+))?/?$")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method):
+        start = time.perf_counter()
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        body = json.loads(raw) if raw else None
+
+        topic_match = LocalServicesHandler.topic_path.match(self.path)
+        connector_match = LocalServicesHandler.connector_path.match(self.path)
+        if topic_match and method == "POST":
+            endpoint = "POST /topics/<topic>"
+            status, response = self.server.produce(topic_match.group("topic"), body)
+        elif topic_match is None and self.path == "/topics" and method == "GET":
+            endpoint = "GET /topics"
+            status, response = 200, sorted(self.server.topics)
+        elif connector_match:
+            name = connector_match.group("name")
+            endpoint = f"{method} /connectors" + ("/<name>" if name else "")
+            status, response = self.server.connector(method, name, body)
+        else:
+            endpoint = f"{method} <unknown>"
+            status, response = 404, {"error_code": 404, "message": "Not found"}
+
+        out = b"" if response is None else json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        if out:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+        self.server.log.record(endpoint, time.perf_counter() - start, len(raw), len(out))
+
+    def log_message(self, format, *args):
+        """Requests are recorded in the request log rather than printed"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--rest-proxy-port", type=int, default=8082)
+    parser.add_argument("--connect-port", type=int, default=8083)
+    args = parser.parse_args()
+
+    services = [
+        LocalServices(args.host, args.rest_proxy_port).start(),
+        LocalServices(args.host, args.connect_port).start(),
+    ]
+    print(f"serving REST Proxy on {services[0].url} and Kafka Connect on {services[1].url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for service in services:
+            service.stop()
+            for endpoint, stats in sorted(service.log.stats().items()):
+                print(f"{endpoint}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
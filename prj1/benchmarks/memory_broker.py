@@ -0,0 +1,427 @@
+"""In-memory Kafka broker implementing the producer and consumer transports
+
+MemoryTransport plugs into ProducerPool.transport in the producers and
+KafkaConsumer.transport in the consumers, so the simulation and the dashboard models can
+exchange messages in a single process without Kafka or the Schema Registry. The broker
+keeps topics as lists of partitions, assigns offsets, tracks committed offsets by consumer
+group and resolves regex subscriptions. Avro messages go through the Confluent wire format
+with an in-memory schema registry, so encoding and decoding costs stay realistic.
+"""
+from concurrent.futures import Future
+import re
+import threading
+import time
+import types
+import zlib
+
+import confluent_kafka
+from confluent_kafka import TopicPartition
+from confluent_kafka.avro.serializer.message_serializer import MessageSerializer
+
+
+class MemorySchemaRegistry:
+    """Assigns schema ids in-process, mirroring CachedSchemaRegistryClient"""
+
+    auto_register_schemas = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.schemas_by_id = {}
+        self.ids_by_schema = {}
+
+    def register(self, subject, avro_schema):
+        # Parsed schemas hash by value, like the keys of CachedSchemaRegistryClient
+        with self._lock:
+            schema_id = self.ids_by_schema.get(avro_schema)
+            if schema_id is None:
+                schema_id = len(self.schemas_by_id) + 1
+                self.ids_by_schema[avro_schema] = schema_id
+                self.schemas_by_id[schema_id] = avro_schema
+            return schema_id
+
+    def check_registration(self, subject, avro_schema):
+        return self.ids_by_schema.get(avro_schema)
+
+    def get_by_id(self, schema_id):
+        return self.schemas_by_id.get(schema_id)
+
+
+class MemoryMessage:
+    """A consumed or delivered message, with the accessors of confluent_kafka.Message"""
+
+    __slots__ = ("_topic", "_partition", "_offset", "_key", "_value", "_timestamp")
+
+    def __init__(self, topic, partition, offset, key, value, timestamp):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._timestamp = timestamp
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def timestamp(self):
+        return confluent_kafka.TIMESTAMP_CREATE_TIME, self._timestamp
+
+    def headers(self):
+        return None
+
+    def error(self):
+        return None
+
+    def set_key(self, key):
+        self._key = key
+
+    def set_value(self, value):
+        self._value = value
+
+
+class MemoryBroker:
+    """Topics, partitions and committed offsets, shared by every client of the broker"""
+
+    def __init__(self, auto_create_partitions=1):
+        self.auto_create_partitions = auto_create_partitions
+        self.schema_registry = MemorySchemaRegistry()
+        self.condition = threading.Condition()
+        # topic name -> list of partitions, each a list of (key, value, timestamp)
+        self.topics = {}
+        self.configs = {}
+        # (group id, topic, partition) -> next offset to consume
+        self.committed = {}
+        # Bumped whenever topics or partitions change, so consumers re-resolve patterns
+        self.version = 0
+
+    def create_topic(self, name, num_partitions=1, config=None):
+        """Creates a topic, returning False if it already exists"""
+        with self.condition:
+            if name in self.topics:
+                return False
+            self.topics[name] = [[] for _ in range(num_partitions)]
+            self.configs[name] = dict(config or {})
+            self.version += 1
+            return True
+
+    def add_partitions(self, name, total_count):
+        """Grows a topic to total_count partitions"""
+        with self.condition:
+            partitions = self.topics[name]
+            if total_count <= len(partitions):
+                raise ValueError(f"topic {name} already has {len(partitions)} partitions")
+            partitions.extend([] for _ in range(total_count - len(partitions)))
+            self.version += 1
+
+    def append(self, topic, partition, key, value):
+        """Appends a message, creating the topic if needed, and returns its offset"""
+        with self.condition:
+            if topic not in self.topics:
+                self.create_topic(topic, self.auto_create_partitions)
+            log = self.topics[topic][partition]
+            log.append((key, value, int(time.time() * 1000)))
+            self.condition.notify_all()
+            return len(log) - 1
+
+    def num_partitions(self, topic):
+        with self.condition:
+            if topic not in self.topics:
+                self.create_topic(topic, self.auto_create_partitions)
+            return len(self.topics[topic])
+
+    def end_offset(self, topic, partition):
+        with self.condition:
+            return len(self.topics[topic][partition])
+
+    def fetch(self, topic, partition, offset):
+        """Returns the message at offset, or None if the partition has not reached it"""
+        log = self.topics[topic][partition]
+        if offset >= len(log):
+            return None
+        key, value, timestamp = log[offset]
+        return MemoryMessage(topic, partition, offset, key, value, timestamp)
+
+    def matching_partitions(self, subscriptions):
+        """Returns the (topic, partition) pairs matching names and ^regex subscriptions"""
+        with self.condition:
+            matched = []
+            for topic in sorted(self.topics):
+                for subscription in subscriptions:
+                    if subscription.startswith("^"):
+                        if re.match(subscription, topic) is None:
+                            continue
+                    elif subscription != topic:
+                        continue
+                    matched.extend(
+                        (topic, partition) for partition in range(len(self.topics[topic]))
+                    )
+                    break
+            return matched
+
+
+class MemoryProducer:
+    """An AvroProducer- and Producer-compatible client appending to a MemoryBroker"""
+
+    def __init__(self, broker, config, schema_registry):
+        self.broker = broker
+        self.on_delivery = config.get("on_delivery")
+        self.serializer = MessageSerializer(schema_registry)
+        self._pending = []
+        self._round_robin = {}
+
+    def _partition(self, topic, key, partition):
+        if partition is not None and partition >= 0:
+            return partition
+        num_partitions = self.broker.num_partitions(topic)
+        if key is not None:
+            return zlib.crc32(key) % num_partitions
+        self._round_robin[topic] = (self._round_robin.get(topic, -1) + 1) % num_partitions
+        return self._round_robin[topic]
+
+    def produce(
+        self, topic, value=None, key=None, value_schema=None, key_schema=None, **kwargs
+    ):
+        """Encodes the key and value with their Avro schemas, then produces them"""
+        if key is not None and key_schema is not None:
+            key = self.serializer.encode_record_with_schema(topic, key_schema, key, True)
+        if value is not None and value_schema is not None:
+            value = self.serializer.encode_record_with_schema(topic, value_schema, value)
+        self.produce_raw(topic, key, value, kwargs.get("partition"))
+
+    def produce_raw(self, topic, key, value, partition=None):
+        """Produces already serialized key and value bytes"""
+        partition = self._partition(topic, key, partition)
+        offset = self.broker.append(topic, partition, key, value)
+        if self.on_delivery is not None:
+            self._pending.append(MemoryMessage(topic, partition, offset, key, value, None))
+
+    def poll(self, timeout=None):
+        """Serves the delivery callbacks of every message produced so far"""
+        pending, self._pending = self._pending, []
+        for message in pending:
+            self.on_delivery(None, message)
+        return len(pending)
+
+    def flush(self, timeout=None):
+        self.poll()
+        return 0
+
+    def __len__(self):
+        return len(self._pending)
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _failed(error):
+    future = Future()
+    future.set_exception(confluent_kafka.KafkaException(confluent_kafka.KafkaError(error)))
+    return future
+
+
+class MemoryAdmin:
+    """An AdminClient-compatible client for a MemoryBroker"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def list_topics(self, topic=None, timeout=-1):
+        with self.broker.condition:
+            topics = {
+                name: types.SimpleNamespace(
+                    topic=name,
+                    partitions={
+                        i: types.SimpleNamespace(id=i, leader=0, replicas=[0], isrs=[0])
+                        for i in range(len(partitions))
+                    },
+                    error=None,
+                )
+                for name, partitions in self.broker.topics.items()
+            }
+        brokers = {0: types.SimpleNamespace(id=0, host="memory", port=0)}
+        return types.SimpleNamespace(brokers=brokers, topics=topics)
+
+    def create_topics(self, new_topics, **kwargs):
+        futures = {}
+        for topic in new_topics:
+            if self.broker.create_topic(topic.topic, topic.num_partitions, topic.config):
+                futures[topic.topic] = _done(None)
+            else:
+                futures[topic.topic] = _failed(confluent_kafka.KafkaError.TOPIC_ALREADY_EXISTS)
+        return futures
+
+    def create_partitions(self, new_partitions, **kwargs):
+        futures = {}
+        for partitions in new_partitions:
+            try:
+                self.broker.add_partitions(partitions.topic, partitions.new_total_count)
+                futures[partitions.topic] = _done(None)
+            except (KeyError, ValueError):
+                futures[partitions.topic] = _failed(
+                    confluent_kafka.KafkaError.INVALID_PARTITIONS
+                )
+        return futures
+
+    def describe_configs(self, resources, **kwargs):
+        with self.broker.condition:
+            return {
+                resource: _done(
+                    {
+                        name: types.SimpleNamespace(name=name, value=str(value))
+                        for name, value in self.broker.configs.get(resource.name, {}).items()
+                    }
+                )
+                for resource in resources
+            }
+
+
+class MemoryConsumer:
+    """A Consumer-compatible client for a MemoryBroker, optionally decoding Avro"""
+
+    def __init__(self, broker, config, schema_registry=None):
+        self.broker = broker
+        self.group_id = config["group.id"]
+        topic_config = config.get("default.topic.config", {})
+        self.offset_reset = config.get(
+            "auto.offset.reset", topic_config.get("auto.offset.reset", "latest")
+        )
+        self.serializer = (
+            MessageSerializer(schema_registry) if schema_registry is not None else None
+        )
+        self.subscriptions = []
+        self.on_assign = None
+        self._version = None
+        # (topic, partition) -> next offset to consume
+        self.positions = {}
+        self._order = []
+        self._next = 0
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None):
+        self.subscriptions = list(topics)
+        self.on_assign = on_assign
+        self._version = None
+
+    def _refresh_assignment(self):
+        """Assigns any partitions that newly match the subscriptions"""
+        if self._version == self.broker.version:
+            return
+        self._version = self.broker.version
+        new_partitions = [
+            TopicPartition(topic, partition)
+            for topic, partition in self.broker.matching_partitions(self.subscriptions)
+            if (topic, partition) not in self.positions
+        ]
+        if not new_partitions:
+            return
+        if self.on_assign is not None:
+            self.on_assign(self, new_partitions)
+        else:
+            self.assign(new_partitions)
+
+    def assign(self, partitions):
+        for tp in partitions:
+            if tp.offset == confluent_kafka.OFFSET_BEGINNING:
+                offset = 0
+            elif tp.offset == confluent_kafka.OFFSET_END:
+                offset = self.broker.end_offset(tp.topic, tp.partition)
+            elif tp.offset >= 0:
+                offset = tp.offset
+            else:
+                offset = self.broker.committed.get((self.group_id, tp.topic, tp.partition))
+                if offset is None:
+                    offset = (
+                        0
+                        if self.offset_reset in ("earliest", "smallest", "beginning")
+                        else self.broker.end_offset(tp.topic, tp.partition)
+                    )
+            self.positions[(tp.topic, tp.partition)] = offset
+        self._order = list(self.positions)
+
+    def _next_message(self):
+        """Returns the next message from the assigned partitions, round robin"""
+        for _ in range(len(self._order)):
+            topic_partition = self._order[self._next % len(self._order)]
+            self._next += 1
+            message = self.broker.fetch(*topic_partition, self.positions[topic_partition])
+            if message is None:
+                continue
+            self.positions[topic_partition] = message.offset() + 1
+            self.broker.committed[(self.group_id, *topic_partition)] = message.offset() + 1
+            if self.serializer is not None:
+                if message.key() is not None:
+                    message.set_key(self.serializer.decode_message(message.key(), True))
+                if message.value() is not None:
+                    message.set_value(self.serializer.decode_message(message.value()))
+            return message
+        return None
+
+    def poll(self, timeout=None):
+        """Returns the next message, waiting up to timeout seconds for one"""
+        deadline = None if timeout is None or timeout < 0 else time.monotonic() + timeout
+        with self.broker.condition:
+            while True:
+                self._refresh_assignment()
+                message = self._next_message()
+                if message is not None:
+                    return message
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.broker.condition.wait(remaining)
+
+    def consume(self, num_messages=1, timeout=-1):
+        """Returns up to num_messages messages, waiting up to timeout for the first one"""
+        first = self.poll(timeout)
+        if first is None:
+            return []
+        messages = [first]
+        while len(messages) < num_messages:
+            message = self.poll(0)
+            if message is None:
+                break
+            messages.append(message)
+        return messages
+
+    def close(self):
+        self.positions.clear()
+        self._order = []
+
+
+class MemoryTransport:
+    """Builds producer, admin and consumer clients connected to a MemoryBroker"""
+
+    def __init__(self, broker=None):
+        self.broker = broker if broker is not None else MemoryBroker()
+
+    def schema_registry(self, url):
+        return self.broker.schema_registry
+
+    def producer(self, config, schema_registry):
+        return MemoryProducer(self.broker, config, schema_registry)
+
+    def raw_producer(self, config):
+        return MemoryProducer(self.broker, config, self.broker.schema_registry)
+
+    def admin(self, config):
+        return MemoryAdmin(self.broker)
+
+    def consumer(self, config, is_avro):
+        registry = self.broker.schema_registry if is_avro else None
+        return MemoryConsumer(self.broker, config, registry)
+
+    def avro_decoder(self, url):
+        return MessageSerializer(self.broker.schema_registry)
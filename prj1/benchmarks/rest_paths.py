@@ -0,0 +1,92 @@
+"""Load test of the weather and Kafka Connect REST paths against local stand-ins
+
+Drives Weather.run and connector.configure_connector as fast as possible against the
+in-process services of benchmarks/local_services.py, so neither the REST Proxy nor Kafka
+Connect needs to be running. Prints the client throughput along with the latency and
+payload sizes the stand-in recorded for every endpoint. Weather is still a Producer and
+provisions its topic on its first run, so the producers use the in-memory broker of
+benchmarks/memory_broker.py.
+
+Run from the prj1 directory:
+
+    python benchmarks/rest_paths.py --weather 5000 --batch-size 10 --connector 1000
+"""
+import argparse
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, f"{Path(__file__).parents[1]}/producers")
+sys.path.insert(0, f"{Path(__file__).parents[0]}")
+
+import connector
+from local_services import LocalServices
+from memory_broker import MemoryTransport
+from models import Weather
+from models.producer import ProducerPool
+
+
+def bench_weather(services, num_records, batch_size):
+    """Runs the weather model num_records times, posting batch_size records at a time"""
+    Weather.rest_proxy_url = services.url
+    weather = Weather(month=1, batch_size=batch_size)
+    start = time.perf_counter()
+    for _ in range(num_records):
+        weather.run(month=1)
+    weather.client.flush()
+    secs = time.perf_counter() - start
+    weather.close()
+    return secs
+
+
+def bench_connector(services, num_calls):
+    """Configures the connector num_calls times, creating it on every call"""
+    connector.KAFKA_CONNECT_URL = f"{services.url}/connectors"
+    start = time.perf_counter()
+    for _ in range(num_calls):
+        services.reset_connectors()
+        connector.configure_connector()
+    return time.perf_counter() - start
+
+
+def print_stats(services):
+    for endpoint, stats in sorted(services.log.stats().items()):
+        print(
+            f"  {endpoint:<26} {stats['requests']:7d} requests  "
+            f"mean {stats['mean_latency'] * 1000:7.3f}ms  "
+            f"p99 {stats['p99_latency'] * 1000:7.3f}ms  "
+            f"{stats['request_bytes'] / stats['requests']:8.0f} B/request"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weather", type=int, default=5000, help="weather records")
+    parser.add_argument("--batch-size", type=int, default=10, help="records per post")
+    parser.add_argument("--connector", type=int, default=1000, help="connector calls")
+    args = parser.parse_args()
+
+    ProducerPool.transport = MemoryTransport()
+    services = LocalServices().start()
+    try:
+        for batch_size in sorted({1, args.batch_size}):
+            services.log.clear()
+            secs = bench_weather(services, args.weather, batch_size)
+            print(
+                f"weather, {batch_size} per post: {secs:8.3f}s  "
+                f"{args.weather / secs:10,.0f} records/s"
+            )
+            print_stats(services)
+
+        services.log.clear()
+        secs = bench_connector(services, args.connector)
+        print(
+            f"connector:            {secs:8.3f}s  {args.connector / secs:10,.0f} calls/s"
+        )
+        print_stats(services)
+    finally:
+        services.stop()
+
+
+if __name__ == "__main__":
+    main()
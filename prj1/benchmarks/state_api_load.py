@@ -0,0 +1,186 @@
+"""Load test of the dashboard's JSON state API at many concurrent clients
+
+Serves /api/state and /api/stations/<id> from a separate process, with the Lines model
+filled from the CTA station list and trains arriving at a steady rate, so snapshots keep
+being invalidated while the clients read them. The clients keep --concurrency requests
+in flight for --duration seconds and report requests per second and latencies. The
+clients run on the same host, so on a small machine they limit the rate measured.
+With --conditional they send the ETag of their previous response, as a polling
+dashboard would, and get a 304 when no train arrived since then.
+
+Run from the prj1 directory:
+
+    python benchmarks/state_api_load.py --concurrency 1000 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+from pathlib import Path
+import random
+import sys
+import time
+
+import pandas as pd
+import tornado.httpclient
+import tornado.ioloop
+import tornado.web
+
+sys.path.insert(0, f"{Path(__file__).parents[1]}/consumers")
+
+from models import Lines, Weather
+from state import StateHandler, StateSnapshot, StationHandler
+
+
+STATIONS_CSV = f"{Path(__file__).parents[1]}/producers/data/cta_stations.csv"
+
+
+class Message:
+    """The parts of a Kafka message the Lines model reads"""
+
+    def __init__(self, topic, value):
+        self._topic = topic
+        self._value = value
+
+    def topic(self):
+        return self._topic
+
+    def value(self):
+        return self._value
+
+
+def build_lines():
+    """Returns a Lines model holding every CTA station, and the stations by line"""
+    lines = Lines()
+    stations = {}
+    for _, row in pd.read_csv(STATIONS_CSV).iterrows():
+        line = next((c for c in ("red", "blue", "green") if row[c]), None)
+        if line is None:
+            continue
+        record = {
+            "station_id": int(row["station_id"]),
+            "station_name": row["station_name"],
+            "order": int(row["order"]),
+            "line": line,
+        }
+        lines.process_message(Message("org.chicago.cta.stations.table.v1", json.dumps(record)))
+        stations.setdefault(line, []).append(record["station_id"])
+    return lines, stations
+
+
+def serve(port, arrivals_per_sec, ready):
+    """Serves the state API on port, applying arrivals_per_sec random arrivals"""
+    logging.getLogger().setLevel(logging.WARNING)
+    lines, stations = build_lines()
+    snapshot = StateSnapshot(Weather(), lines)
+    application = tornado.web.Application(
+        [
+            (r"/api/state", StateHandler, {"snapshot": snapshot}),
+            (r"/api/stations/([0-9]+)", StationHandler, {"snapshot": snapshot}),
+        ],
+        compress_response=True,
+    )
+    application.listen(port, backlog=4096)
+
+    def arrive():
+        line = random.choice(list(stations))
+        value = {
+            "station_id": random.choice(stations[line]),
+            "line": line,
+            "direction": random.choice("ab"),
+            "train_id": f"{line[0].upper()}L{random.randrange(10):03}",
+            "train_status": "on_time",
+            "prev_station_id": None,
+            "prev_direction": None,
+        }
+        lines.process_message(Message(f"org.chicago.cta.station.arrivals.{line}", value))
+
+    if arrivals_per_sec > 0:
+        tornado.ioloop.PeriodicCallback(arrive, 1000 / arrivals_per_sec).start()
+    ready.set()
+    tornado.ioloop.IOLoop.current().start()
+
+
+async def load(url, station_ids, concurrency, duration, conditional):
+    """Keeps concurrency requests in flight for duration seconds, returning the results"""
+    tornado.httpclient.AsyncHTTPClient.configure(None, max_clients=concurrency)
+    client = tornado.httpclient.AsyncHTTPClient()
+    deadline = time.perf_counter() + duration
+    latencies = []
+    statuses = {}
+    response_bytes = 0
+
+    async def worker(i):
+        nonlocal response_bytes
+        etag = None
+        n = 0
+        while time.perf_counter() < deadline:
+            # One request in ten reads a single station
+            if n % 10 == i % 10:
+                path = f"/api/stations/{random.choice(station_ids)}"
+            else:
+                path = "/api/state"
+            n += 1
+            headers = {"Accept-Encoding": "gzip"}
+            if conditional and etag is not None and path == "/api/state":
+                headers["If-None-Match"] = etag
+            start = time.perf_counter()
+            response = await client.fetch(
+                url + path, headers=headers, raise_error=False, decompress_response=False
+            )
+            latencies.append(time.perf_counter() - start)
+            statuses[response.code] = statuses.get(response.code, 0) + 1
+            response_bytes += len(response.body or b"")
+            if path == "/api/state" and response.code == 200:
+                etag = response.headers.get("Etag")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies), statuses, response_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--arrivals", type=float, default=50.0, help="arrivals per second")
+    parser.add_argument("--conditional", action="store_true", help="send If-None-Match")
+    parser.add_argument("--port", type=int, default=8889)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=serve, args=(args.port, args.arrivals, ready), daemon=True
+    )
+    server.start()
+    ready.wait()
+
+    _, stations = build_lines()
+    station_ids = sorted({station_id for ids in stations.values() for station_id in ids})
+    try:
+        secs, latencies, statuses, response_bytes = asyncio.run(
+            load(
+                f"http://127.0.0.1:{args.port}",
+                station_ids,
+                args.concurrency,
+                args.duration,
+                args.conditional,
+            )
+        )
+    finally:
+        server.terminate()
+        server.join()
+
+    requests = len(latencies)
+    print(f"concurrency:         {args.concurrency}")
+    print(f"requests:            {requests}")
+    print(f"statuses:            {dict(sorted(statuses.items()))}")
+    print(f"requests per second: {requests / secs:10,.0f}")
+    print(f"mean latency:        {sum(latencies) / requests * 1000:8.1f}ms")
+    print(f"p99 latency:         {latencies[int(0.99 * (requests - 1))] * 1000:8.1f}ms")
+    print(f"bytes per response:  {response_bytes / requests:10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
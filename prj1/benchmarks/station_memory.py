@@ -0,0 +1,119 @@
+"""Memory and GC cost of the dashboard's Station model at 100k stations
+
+Builds --stations consumer Station objects, then delivers --arrivals arrivals with freshly
+decoded train ids and statuses, as the Avro consumer hands them over. It does this for the
+slotted Station of consumers/models/station.py and for DictStation, which keeps the
+previous implementation: attributes in a __dict__ and a new dict for every arrival.
+Reports the memory held once the stations are built, the arrival time and a full
+collection's time.
+
+Run from the prj1 directory:
+
+    python benchmarks/station_memory.py --stations 100000
+"""
+import argparse
+import gc
+from pathlib import Path
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, f"{Path(__file__).parents[1]}/consumers")
+
+from models import Station
+
+
+class DictStation:
+    """The consumer Station before it used __slots__ and interned strings"""
+
+    def __init__(self, station_id, station_name, order):
+        self.station_id = station_id
+        self.station_name = station_name
+        self.order = order
+        self.dir_a = None
+        self.dir_b = None
+        self.num_turnstile_entries = 0
+        self.version = 0
+
+    def handle_arrival(self, direction, train_id, train_status):
+        status_dict = {"train_id": train_id, "status": train_status.replace("_", " ")}
+        if direction == "a":
+            self.dir_a = status_dict
+        else:
+            self.dir_b = status_dict
+        self.version += 1
+
+
+def decoded_arrivals(num_stations, num_arrivals, num_trains):
+    """Returns arrivals whose strings are distinct objects, like freshly decoded messages"""
+    rng = random.Random(0)
+    statuses = ("on_time", "delayed", "out_of_service")
+    return [
+        (
+            rng.randrange(num_stations),
+            rng.choice("ab"),
+            "".join(("BL", str(rng.randrange(num_trains)).zfill(4))),
+            "".join((rng.choice(statuses), "")),
+        )
+        for _ in range(num_arrivals)
+    ]
+
+
+def build(station_cls, num_stations, arrivals):
+    """Returns num_stations stations of station_cls after delivering the arrivals"""
+    stations = [station_cls(40000 + i, f"Station {i}", i) for i in range(num_stations)]
+    for index, direction, train_id, train_status in arrivals:
+        stations[index].handle_arrival(direction, train_id, train_status)
+    return stations
+
+
+def bench(station_cls, num_stations, arrivals):
+    """Returns the bytes held, arrival seconds and collection seconds for station_cls"""
+    gc.collect()
+    tracemalloc.start()
+    stations = build(station_cls, num_stations, arrivals)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    gc.collect()
+    gc_secs = time.perf_counter() - start
+
+    # Time the arrivals again without tracemalloc slowing them down
+    start = time.perf_counter()
+    for index, direction, train_id, train_status in arrivals:
+        stations[index].handle_arrival(direction, train_id, train_status)
+    arrival_secs = time.perf_counter() - start
+    return held, arrival_secs, gc_secs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=100_000)
+    parser.add_argument("--arrivals", type=int, default=500_000)
+    parser.add_argument("--trains", type=int, default=5_000)
+    args = parser.parse_args()
+
+    arrivals = decoded_arrivals(args.stations, args.arrivals, args.trains)
+    results = {}
+    for station_cls in (DictStation, Station):
+        results[station_cls.__name__] = bench(station_cls, args.stations, arrivals)
+        del arrivals
+        # Each run gets strings that were never interned
+        arrivals = decoded_arrivals(args.stations, args.arrivals, args.trains)
+
+    print(f"stations: {args.stations}, arrivals: {args.arrivals}, trains: {args.trains}")
+    for name, (held, arrival_secs, gc_secs) in results.items():
+        print(
+            f"{name:12} {held / 2 ** 20:8.1f} MiB  {held / args.stations:6.0f} B/station"
+            f"  arrivals {arrival_secs:6.3f}s  gc {gc_secs * 1000:7.1f}ms"
+        )
+    base, slotted = results["DictStation"], results["Station"]
+    print(f"memory:   {base[0] / slotted[0]:.2f}x smaller")
+    print(f"arrivals: {base[1] / slotted[1]:.2f}x faster")
+    print(f"gc:       {base[2] / slotted[2]:.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Micro-benchmark comparing AvroProducer.produce against pre-serialized turnstile values
+
+Both paths only enqueue messages on a local librdkafka client, so no broker needs to be
+running, and schema ids are assigned by an in-process stand-in for the schema registry.
+Before timing, the cached serializer's keys and values are checked to be byte-identical
+to the ones MessageSerializer, which AvroProducer uses, encodes for the same records.
+
+Run from the prj1 directory:
+
+    python benchmarks/turnstile_serializer.py --messages 200000
+"""
+import argparse
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, f"{Path(__file__).parents[1]}/producers")
+
+from confluent_kafka import Producer as KafkaProducer
+from confluent_kafka.avro import AvroProducer
+from confluent_kafka.avro.serializer.message_serializer import MessageSerializer
+
+from models import Turnstile
+from models.producer import Producer
+from models.serializer import CachedAvroSerializer
+
+
+TOPIC = "org.chicago.cta.station.turnstile.v1"
+VALUE = {"station_id": 40380, "station_name": "Clark/Lake", "line": "blue"}
+
+
+class LocalSchemaRegistry:
+    """Assigns schema ids in-process, mirroring CachedSchemaRegistryClient.register"""
+
+    auto_register_schemas = True
+
+    def __init__(self):
+        self.subject_to_schema_ids = {}
+        self.next_id = 1
+
+    def register(self, subject, avro_schema):
+        schema_ids = self.subject_to_schema_ids.setdefault(subject, {})
+        if avro_schema not in schema_ids:
+            schema_ids[avro_schema] = self.next_id
+            self.next_id += 1
+        return schema_ids[avro_schema]
+
+
+def check_wire_format(num_records):
+    """Asserts the cached serializer encodes the same bytes as MessageSerializer"""
+    registry = LocalSchemaRegistry()
+    reference = MessageSerializer(registry)
+    serializer = CachedAvroSerializer(
+        registry, TOPIC, Turnstile.key_schema, Turnstile.value_schema
+    )
+    values = [
+        VALUE,
+        {"station_id": 0, "station_name": "", "line": "red"},
+        {"station_id": -40380, "station_name": "Addison (O\u2019Hare)", "line": "green"},
+    ]
+    timestamps = [0, 1, -1, 63, 64, -65, 2 ** 31, Producer.time_millis(), 2 ** 63 - 1, -(2 ** 63)]
+    timestamps.extend(Producer.time_millis() + i * 7919 for i in range(num_records))
+    for timestamp in timestamps:
+        key = {"timestamp": timestamp}
+        expected = reference.encode_record_with_schema(TOPIC, Turnstile.key_schema, key, True)
+        assert serializer.encode_timestamp_key(timestamp) == expected, timestamp
+        assert serializer.encode_key(key) == expected, timestamp
+    for value in values:
+        expected = reference.encode_record_with_schema(TOPIC, Turnstile.value_schema, value)
+        cache_key = (value["station_id"], value["line"])
+        assert serializer.encode_value(value) == expected, value
+        # Once from the encoder and once from the cache
+        assert serializer.encode_value(value, cache_key=cache_key) == expected, value
+        assert serializer.encode_value(value, cache_key=cache_key) == expected, value
+    return len(timestamps) + len(values)
+
+
+def bench_avro_producer(config, num_messages):
+    """Produces through AvroProducer, which encodes key and value for every message"""
+    producer = AvroProducer(config, schema_registry=LocalSchemaRegistry())
+    start = time.perf_counter()
+    for _ in range(num_messages):
+        producer.produce(
+            topic=TOPIC,
+            key_schema=Turnstile.key_schema,
+            key={"timestamp": Producer.time_millis()},
+            value_schema=Turnstile.value_schema,
+            value=VALUE,
+        )
+    return time.perf_counter() - start
+
+
+def bench_cached_serializer(config, num_messages):
+    """Produces cached value bytes and a directly encoded key through the plain Producer"""
+    producer = KafkaProducer(config)
+    serializer = CachedAvroSerializer(
+        LocalSchemaRegistry(), TOPIC, Turnstile.key_schema, Turnstile.value_schema
+    )
+    start = time.perf_counter()
+    value = serializer.encode_value(VALUE, cache_key=(VALUE["station_id"], VALUE["line"]))
+    for _ in range(num_messages):
+        producer.produce(
+            TOPIC,
+            key=serializer.encode_timestamp_key(Producer.time_millis()),
+            value=value,
+        )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--bootstrap-servers", default="PLAINTEXT://localhost:9092")
+    args = parser.parse_args()
+
+    config = {
+        "bootstrap.servers": args.bootstrap_servers,
+        # Keep every message in the local queue so neither path blocks on the broker
+        "queue.buffering.max.messages": args.messages + 1,
+        "queue.buffering.max.kbytes": 2097151,
+    }
+
+    checked = check_wire_format(1000)
+    avro_secs = bench_avro_producer(config, args.messages)
+    cached_secs = bench_cached_serializer(config, args.messages)
+
+    print(f"messages:              {args.messages}")
+    print(f"wire format:           {checked} keys and values identical to AvroProducer")
+    print(
+        f"AvroProducer.produce:  {avro_secs:8.3f}s  "
+        f"{args.messages / avro_secs:12,.0f} msg/s"
+    )
+    print(
+        f"cached serializer:     {cached_secs:8.3f}s  "
+        f"{args.messages / cached_secs:12,.0f} msg/s"
+    )
+    print(f"speedup:               {avro_secs / cached_secs:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Startup benchmark for building TurnstileHardware from a large ridership seed file
+
+Writes a synthetic seed file (100k rows by default, many months per station) and compares
+the per-station DataFrame scan that TurnstileHardware used to perform against the indexed
+lookups it performs now.
+
+Run from the prj1 directory:
+
+    python benchmarks/turnstile_startup.py --rows 100000 --stations 2000
+"""
+import argparse
+import datetime
+from pathlib import Path
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, f"{Path(__file__).parents[1]}/producers")
+
+from models.turnstile_hardware import TurnstileHardware
+
+
+def write_seed_file(path, num_rows, num_stations, seed=0):
+    """Writes a synthetic ridership seed file with num_rows rows spread over the stations"""
+    rng = np.random.default_rng(seed)
+    num_months = -(-num_rows // num_stations)
+    station_ids = np.tile(np.arange(40000, 40000 + num_stations), num_months)[:num_rows]
+    month_index = np.repeat(np.arange(num_months), num_stations)[:num_rows]
+    months = [
+        datetime.date(2000 + month // 12, month % 12 + 1, 1).strftime("%m/%d/%Y")
+        for month in range(num_months)
+    ]
+    weekday = rng.uniform(0, 25000, num_rows).round(1)
+    pd.DataFrame(
+        {
+            "station_id": station_ids,
+            "stationame": [f"Station {station_id}" for station_id in station_ids],
+            "month_beginning": [months[i] for i in month_index],
+            "avg_weekday_rides": weekday,
+            "avg_saturday_rides": (weekday * 0.4).round(1),
+            "avg_sunday-holiday_rides": (weekday * 0.3).round(1),
+            "monthtotal": (weekday * 25).astype(int),
+        }
+    ).to_csv(path, index=False)
+    return [int(station_id) for station_id in np.unique(station_ids)]
+
+
+def bench_scan(seed_path, station_ids):
+    """The original approach: one boolean mask over the whole seed file per station"""
+    start = time.perf_counter()
+    seed_df = pd.read_csv(seed_path)
+    for station_id in station_ids:
+        metrics_df = seed_df[seed_df["station_id"] == station_id]
+        int(round(metrics_df.iloc[0]["avg_weekday_rides"]))
+        int(round(metrics_df.iloc[0]["avg_saturday_rides"]))
+        int(round(metrics_df.iloc[0]["avg_sunday-holiday_rides"]))
+    return time.perf_counter() - start
+
+
+def bench_index(seed_path, station_ids):
+    """The indexed approach: load once, then constant time lookups per station"""
+    TurnstileHardware.seed_path = seed_path
+    TurnstileHardware.seed_df = None
+    start = time.perf_counter()
+    for station_id in station_ids:
+        TurnstileHardware(types.SimpleNamespace(station_id=station_id))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--stations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        seed_path = f"{tmp_dir}/ridership_seed.csv"
+        station_ids = write_seed_file(seed_path, args.rows, args.stations)
+
+        scan_secs = bench_scan(seed_path, station_ids)
+        index_secs = bench_index(seed_path, station_ids)
+
+    print(f"seed rows:        {args.rows}")
+    print(f"stations:         {len(station_ids)}")
+    print(f"DataFrame scans:  {scan_secs:8.3f}s")
+    print(f"indexed lookups:  {index_secs:8.3f}s")
+    print(f"speedup:          {scan_secs / index_secs:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
+from collections import namedtuple
 import logging
+import queue
+import re
+import threading
+import time
+
 import confluent_kafka
-from confluent_kafka import Consumer
-from confluent_kafka.avro import AvroConsumer
 from confluent_kafka.avro.serializer import SerializerError
-from tornado import gen
+from tornado.ioloop import IOLoop
+
+from transport import KafkaTransport
 
 # Logger setup
 logger = logging.getLogger(__name__)
@@ -12,14 +18,95 @@ logger = logging.getLogger(__name__)
 BROKER_URL = "PLAINTEXT://localhost:9092"
 SCHEMA_REGISTRY_URL = "http://localhost:8081"
 
+# A topic name or ^regex pattern consumed by a MultiplexConsumer, and how to handle its messages
+Route = namedtuple(
+    "Route",
+    ["topic_pattern", "message_handler", "batch_handler", "is_avro", "offset_earliest"],
+    defaults=(None, True, False),
+)
+
+
+class ConsumerStats:
+    """
+    Tracks the batch sizes of a consumer and how far behind the producers it is.
+    Lag is the age of the newest message in each batch, from its Kafka timestamp.
+    Queue depth is the number of batches waiting for the IOLoop, including the one
+    being handled, and handler time is how long the handlers held the IOLoop.
+    """
+
+    def __init__(self):
+        self.batches = 0
+        self.messages = 0
+        self.max_batch = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_queue_depth = 0
+        self.max_queue_depth = 0
+        self.handler_secs = 0.0
+        self.max_handler_secs = 0.0
+
+    def record(self, messages, handler_secs=0.0, queue_depth=0):
+        """
+        Records a consumed batch.
+
+        Args:
+            messages (list): The messages of the batch.
+            handler_secs (float): Time spent handling the batch, in seconds.
+            queue_depth (int): Batches queued for the IOLoop when this one was taken.
+        """
+        self.batches += 1
+        self.messages += len(messages)
+        self.max_batch = max(self.max_batch, len(messages))
+        self.last_queue_depth = queue_depth
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        self.handler_secs += handler_secs
+        self.max_handler_secs = max(self.max_handler_secs, handler_secs)
+        timestamp_type, timestamp = messages[-1].timestamp()
+        if timestamp_type != confluent_kafka.TIMESTAMP_NOT_AVAILABLE:
+            self.last_lag = max(time.time() - timestamp / 1000, 0.0)
+            self.max_lag = max(self.max_lag, self.last_lag)
+
+    def stats(self):
+        """
+        Returns the batch, lag, queue and handler metrics, with times in seconds.
+        """
+        return {
+            "batches": self.batches,
+            "messages": self.messages,
+            "mean_batch": self.messages / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "last_queue_depth": self.last_queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_handler_secs": self.handler_secs / self.batches if self.batches else 0.0,
+            "max_handler_secs": self.max_handler_secs,
+        }
+
 
 class KafkaConsumer:
     """
     A Kafka consumer that can handle both regular and Avro messages.
-    This class supports asynchronous message consumption with Tornado.
+    Messages are polled and deserialized on a dedicated thread, and handled on the Tornado IOLoop.
     """
 
-    def __init__(self, topic_name_pattern, message_handler, is_avro=True, offset_earliest=False, sleep_secs=1.0, consume_timeout=0.1):
+    # Builds the Kafka clients, replaceable to consume from another broker implementation
+    transport = KafkaTransport()
+
+    def __init__(
+        self,
+        topic_name_pattern,
+        message_handler,
+        is_avro=True,
+        offset_earliest=False,
+        sleep_secs=1.0,
+        consume_timeout=0.1,
+        batch_size=1,
+        batch_handler=None,
+        min_sleep_secs=0.01,
+        log_every=1000,
+        max_queued_batches=8,
+    ):
         """
         Initializes the KafkaConsumer.
 
@@ -28,14 +115,31 @@ class KafkaConsumer:
             message_handler (function): A handler function to process consumed messages.
             is_avro (bool): Whether the consumer should handle Avro data. Defaults to True.
             offset_earliest (bool): Whether to consume from the earliest offset. Defaults to False.
-            sleep_secs (float): Sleep time between consume attempts in seconds. Defaults to 1.0.
+            sleep_secs (float): Longest sleep between consume attempts once the topic is drained. Defaults to 1.0.
             consume_timeout (float): Timeout for the consume operation. Defaults to 0.1 seconds.
+            batch_size (int): Most messages fetched per consume call. Defaults to 1.
+            batch_handler (function, optional): Handles each batch as a list of messages,
+                in place of calling message_handler for every message.
+            min_sleep_secs (float): First sleep after the topic is drained, doubled on every
+                empty consume up to sleep_secs. Defaults to 0.01 seconds.
+            log_every (int): Log the consumer stats every log_every batches. Defaults to 1000.
+            max_queued_batches (int): Most batches the polling thread queues for the IOLoop
+                before it waits for the handlers to catch up. Defaults to 8.
         """
         self.topic_name_pattern = topic_name_pattern
         self.message_handler = message_handler
         self.sleep_secs = sleep_secs
         self.consume_timeout = consume_timeout
         self.offset_earliest = offset_earliest
+        self.batch_size = batch_size
+        self.batch_handler = batch_handler
+        self.min_sleep_secs = min_sleep_secs
+        self.log_every = log_every
+        self.stats = ConsumerStats()
+        self.batches = queue.Queue(maxsize=max_queued_batches)
+        self._stopped = threading.Event()
+        self._thread = None
+        self._io_loop = None
 
         # Setting Kafka broker properties
         self.broker_properties = {
@@ -49,12 +153,16 @@ class KafkaConsumer:
         # Choose the appropriate consumer based on Avro or regular Kafka
         if is_avro:
             self.broker_properties["schema.registry.url"] = SCHEMA_REGISTRY_URL
-            self.consumer = AvroConsumer(self.broker_properties)
-        else:
-            self.consumer = Consumer(self.broker_properties)
+        self.consumer = KafkaConsumer.transport.consumer(self.broker_properties, is_avro)
 
         # Subscribe to the given topic
-        self.consumer.subscribe([self.topic_name_pattern], on_assign=self.on_assign)
+        self.consumer.subscribe(self._subscriptions(), on_assign=self.on_assign)
+
+    def _subscriptions(self):
+        """
+        Returns the topic names and patterns to subscribe to.
+        """
+        return [self.topic_name_pattern]
 
     def on_assign(self, consumer, partitions):
         """
@@ -74,43 +182,258 @@ class KafkaConsumer:
 
     async def consume(self):
         """
-        Asynchronously consumes messages from the Kafka topic.
+        Starts consuming messages from the Kafka topic on a dedicated polling thread.
 
-        This method loops indefinitely, polling for messages and processing them using the provided handler.
+        The thread polls and deserializes batches, then queues them for the IOLoop, which
+        runs the handlers. Once max_queued_batches are waiting the thread blocks until the
+        handlers catch up, so a slow dashboard throttles polling instead of buffering the topic.
+        When the topic is drained the thread backs off, doubling its sleep from min_sleep_secs
+        up to sleep_secs.
         """
-        while True:
-            num_results = 1
-            while num_results > 0:
-                num_results = self._consume()
-            await gen.sleep(self.sleep_secs)
+        self._io_loop = IOLoop.current()
+        self._thread = threading.Thread(
+            target=self._poll, name=f"consumer {self.topic_name_pattern}", daemon=True
+        )
+        self._thread.start()
+
+    def _poll(self):
+        """
+        Polls batches and queues them for the IOLoop until the consumer is closed.
+        """
+        sleep_secs = 0
+        while not self._stopped.is_set():
+            batch = self._fetch()
+            if not batch:
+                sleep_secs = min(max(sleep_secs * 2, self.min_sleep_secs), self.sleep_secs)
+                self._stopped.wait(sleep_secs)
+                continue
+
+            sleep_secs = 0
+            while not self._stopped.is_set():
+                try:
+                    self.batches.put(batch, timeout=self.sleep_secs)
+                except queue.Full:
+                    continue
+                self._io_loop.add_callback(self._handle_queued)
+                break
+
+    def _handle_queued(self):
+        """
+        Handles the oldest queued batch. Called on the IOLoop once for every queued batch.
+        """
+        queue_depth = self.batches.qsize()
+        self._handle(self.batches.get_nowait(), queue_depth)
 
     def _consume(self):
         """
-        Polls for messages and processes them.
+        Consumes a batch of messages and processes them on the calling thread.
 
         Returns:
-            int: 1 if a message was received and processed, 0 otherwise.
+            int: The number of messages received and processed.
+        """
+        batch = self._fetch()
+        if batch:
+            self._handle(batch)
+        return len(batch)
+
+    def _fetch(self):
+        """
+        Polls a batch of messages, dropping and logging any errors.
+
+        Returns:
+            list: The messages received, deserialized for Avro consumers.
         """
         try:
-            msg = self.consumer.poll(timeout=self.consume_timeout)
+            messages = self.consumer.consume(
+                num_messages=self.batch_size, timeout=self.consume_timeout
+            )
         except Exception as e:
             logger.error(f"Exception occurred while polling from {self.topic_name_pattern}: {e}")
-            return 0
+            return []
 
-        if msg is None:
-            return 0
-        
-        if msg.error():
-            logger.error(f"Error while consuming from {self.topic_name_pattern}: {msg.error()}")
-            return 0
+        batch = []
+        for msg in messages:
+            if msg.error():
+                logger.error(f"Error while consuming from {self.topic_name_pattern}: {msg.error()}")
+            else:
+                batch.append(msg)
+        return batch
+
+    def _handle(self, batch, queue_depth=0):
+        """
+        Processes a batch with the batch handler, or the message handler for every message.
+
+        Args:
+            batch (list): The messages to process.
+            queue_depth (int): Batches that were queued for the IOLoop, including this one.
+        """
+        started = time.perf_counter()
+        self._dispatch(batch)
+        self.stats.record(batch, time.perf_counter() - started, queue_depth)
+        if self.log_every and self.stats.batches % self.log_every == 0:
+            self.log_stats()
+
+    def _dispatch(self, batch):
+        """
+        Calls the batch handler with the batch, or the message handler for every message.
+
+        Args:
+            batch (list): The messages to process.
+        """
+        if self.batch_handler is not None:
+            self.batch_handler(batch)
+        else:
+            for msg in batch:
+                self.message_handler(msg)
 
-        # Handle the message using the provided message handler
-        self.message_handler(msg)
-        return 1
+    def log_stats(self):
+        """
+        Logs the batch size and lag metrics of the consumer.
+        """
+        stats = self.stats.stats()
+        logger.info(
+            "consumer %s: %d messages in %d batches, mean batch %.1f, max %d, lag %.3fs, max %.3fs, "
+            "queue depth %d, max %d, handler %.4fs, max %.4fs",
+            self.topic_name_pattern,
+            stats["messages"],
+            stats["batches"],
+            stats["mean_batch"],
+            stats["max_batch"],
+            stats["last_lag"],
+            stats["max_lag"],
+            stats["last_queue_depth"],
+            stats["max_queue_depth"],
+            stats["mean_handler_secs"],
+            stats["max_handler_secs"],
+        )
 
     def close(self):
         """
-        Closes the Kafka consumer and cleans up any resources.
+        Stops the polling thread, then closes the Kafka consumer and cleans up any resources.
+        Batches still queued for the IOLoop are dropped.
         """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
         self.consumer.close()
+        self.log_stats()
         logger.info(f"Consumer for {self.topic_name_pattern} closed.")
+
+
+class MultiplexConsumer(KafkaConsumer):
+    """
+    A Kafka consumer that reads several topics and patterns with a single client.
+
+    Every assigned topic is matched against the routes once, when its partitions are assigned,
+    and its messages are then dispatched to that route's handlers by a dictionary lookup.
+    Topics of Avro routes are deserialized on the polling thread, the others are passed on as is.
+    """
+
+    def __init__(self, group_id, routes, **kwargs):
+        """
+        Initializes the MultiplexConsumer.
+
+        Args:
+            group_id (str): The consumer group, also used to name the consumer in logs.
+            routes (list): The Routes to consume, in order of precedence when several match a topic.
+            **kwargs: Passed on to KafkaConsumer, except for the per route handlers and flags.
+        """
+        self.routes = list(routes)
+        # topic name -> Route, filled in as partitions are assigned
+        self.dispatch = {}
+        self.decoder = None
+        if any(route.is_avro for route in self.routes):
+            self.decoder = KafkaConsumer.transport.avro_decoder(SCHEMA_REGISTRY_URL)
+        super().__init__(
+            group_id,
+            None,
+            is_avro=False,
+            offset_earliest=any(route.offset_earliest for route in self.routes),
+            **kwargs,
+        )
+
+    def _subscriptions(self):
+        """
+        Returns the topic patterns of every route.
+        """
+        return [route.topic_pattern for route in self.routes]
+
+    def _route(self, topic):
+        """
+        Returns the first route matching a topic name, or None.
+        """
+        for route in self.routes:
+            if route.topic_pattern.startswith("^"):
+                if re.match(route.topic_pattern, topic):
+                    return route
+            elif route.topic_pattern == topic:
+                return route
+        return None
+
+    def on_assign(self, consumer, partitions):
+        """
+        Resolves the route of every newly assigned topic and assigns the partitions,
+        from the earliest offset for routes that ask for it.
+
+        Args:
+            consumer (Consumer): The Kafka consumer instance.
+            partitions (list): List of partitions assigned to the consumer.
+        """
+        for partition in partitions:
+            route = self.dispatch.get(partition.topic)
+            if route is None:
+                route = self._route(partition.topic)
+                if route is None:
+                    logger.warning(f"No route for topic {partition.topic}, ignoring its messages")
+                    continue
+                self.dispatch[partition.topic] = route
+            if route.offset_earliest:
+                partition.offset = confluent_kafka.OFFSET_BEGINNING
+        logger.info(
+            f"{len(partitions)} partitions assigned to {self.topic_name_pattern}, "
+            f"routing {len(self.dispatch)} topics"
+        )
+
+        consumer.assign(partitions)
+
+    def _fetch(self):
+        """
+        Polls a batch of messages and deserializes those of Avro routes.
+
+        Returns:
+            list: The messages received that have a route.
+        """
+        batch = []
+        for msg in super()._fetch():
+            route = self.dispatch.get(msg.topic())
+            if route is None:
+                continue
+            if route.is_avro:
+                try:
+                    if msg.value() is not None:
+                        msg.set_value(self.decoder.decode_message(msg.value()))
+                    if msg.key() is not None:
+                        msg.set_key(self.decoder.decode_message(msg.key(), is_key=True))
+                except SerializerError as e:
+                    logger.error(f"Unable to deserialize message from {msg.topic()}: {e}")
+                    continue
+            batch.append(msg)
+        return batch
+
+    def _dispatch(self, batch):
+        """
+        Groups a batch by route, keeping the order within each topic, and hands every group to
+        its route's batch handler, or every message to its route's message handler.
+
+        Args:
+            batch (list): The messages to process.
+        """
+        groups = {}
+        for msg in batch:
+            groups.setdefault(self.dispatch[msg.topic()], []).append(msg)
+        for route, messages in groups.items():
+            if route.batch_handler is not None:
+                route.batch_handler(messages)
+            else:
+                for msg in messages:
+                    route.message_handler(msg)
@@ -1,4 +1,6 @@
 import logging
+import os
+
 import faust
 
 # Set up logger for better traceability
@@ -32,48 +34,139 @@ class TransformedStation(faust.Record):
     line: str  # Line color (red, blue, green)
 
 
+# The app is started by the faust command, so it is configured from the environment.
+# A rocksdb:// store keeps the table on disk across restarts, and standby replicas keep
+# warm copies on other workers, so recovery does not replay the whole changelog
+STORE = os.environ.get("STATIONS_STORE", "memory://")
+STANDBY_REPLICAS = int(os.environ.get("STATIONS_STANDBY_REPLICAS", "0"))
+# Partitions of the table and its changelog. With more than one, stations are
+# repartitioned by station_id so every station is always written to the same partition
+PARTITIONS = int(os.environ.get("STATIONS_PARTITIONS", "1"))
+# Stations taken per batch, and the longest wait in seconds to fill one. A batch size
+# of 1 transforms every station on its own
+BATCH_SIZE = int(os.environ.get("STATIONS_BATCH_SIZE", "100"))
+BATCH_WITHIN = float(os.environ.get("STATIONS_BATCH_WITHIN", "1.0"))
+
 # Faust application setup
-app = faust.App("stations-stream", broker="kafka://localhost:9092", store="memory://")
+app = faust.App(
+    "stations-stream",
+    broker="kafka://localhost:9092",
+    store=STORE,
+    table_standby_replicas=STANDBY_REPLICAS,
+    topic_partitions=PARTITIONS,
+)
 
 # Define input Kafka Topic where raw station data is ingested
 input_topic = app.topic("postgres-cta-stations", value_type=Station)
 
-# Define output Kafka Topic where transformed station data will be sent
-output_topic = app.topic("org.chicago.cta.stations.table.v1", partitions=1)
+# Define output Kafka Topic where transformed station data will be sent. It is compacted,
+# so the dashboards only replay the latest record of every station when they start
+output_topic = app.topic(
+    "org.chicago.cta.stations.table.v1", partitions=PARTITIONS, compacting=True
+)
 
-# Faust Table to store transformed station records
+# Faust Table to store transformed station records. A batch holds stations of several
+# partitions, so the changelog partition comes from the key rather than the last event
 station_table = app.Table(
     "org.chicago.cta.stations.table.v1",
     default=TransformedStation,
-    partitions=1,
+    partitions=PARTITIONS,
     changelog_topic=output_topic,
+    use_partitioner=True,
 )
 
+# station_id -> content hash of the station last written to the table. Stations that
+# are not in it yet, such as after a restart, are hashed from the table
+station_hashes = {}
+
+
+@app.on_partitions_revoked.connect
+def forget_station_hashes(sender, revoked, **kwargs):
+    """
+    Forgets the hashes on a rebalance, since other workers may write the stations meanwhile.
+    """
+    station_hashes.clear()
+
+
+def transform(station):
+    """
+    Returns the TransformedStation of a Station, assigning its line color.
+    """
+    # Determine the line based on the station flags (red, blue, green)
+    if station.red:
+        line_color = 'red'
+    elif station.blue:
+        line_color = 'blue'
+    elif station.green:
+        line_color = 'green'
+    else:
+        line_color = ''  # Default if no line is marked
+
+    return TransformedStation(
+        station_id=station.station_id,
+        station_name=station.station_name,
+        order=station.order,
+        line=line_color
+    )
+
+
+def content_hash(transformed):
+    """
+    Returns a hash of the fields of a TransformedStation.
+    """
+    return hash((transformed.station_id, transformed.station_name, transformed.order, transformed.line))
+
+
+def stored_hash(station_id):
+    """
+    Returns the content hash of the station in the table, or None if it has none.
+    """
+    if station_id not in station_hashes and station_id in station_table:
+        station_hashes[station_id] = content_hash(station_table[station_id])
+    return station_hashes.get(station_id)
+
+
+def update_station_table(stations):
+    """
+    Writes a batch of stations to the Faust Table, once per station_id and only if it
+    changed. The last record of a station in the batch wins, as it would have one at a time.
+    Every station arrives once per direction, so most records change nothing.
+
+    Returns:
+        int: The number of stations written.
+    """
+    updates = {}
+    for station in stations:
+        transformed = transform(station)
+        updates[transformed.station_id] = transformed
+
+    changed = {}
+    for station_id, transformed in updates.items():
+        new_hash = content_hash(transformed)
+        if stored_hash(station_id) != new_hash:
+            changed[station_id] = transformed
+            station_hashes[station_id] = new_hash
+    station_table.update(changed)
+    return len(changed)
+
 
 @app.agent(input_topic)
 async def transform_station_data(stations):
     """
     Transforms incoming station data by assigning the appropriate line color
-    and storing it in a Faust Table.
-    """
-    async for station in stations:
-        # Determine the line based on the station flags (red, blue, green)
-        if station.red:
-            line_color = 'red'
-        elif station.blue:
-            line_color = 'blue'
-        elif station.green:
-            line_color = 'green'
-        else:
-            line_color = ''  # Default if no line is marked
-
-        # Store the transformed station data into the Faust Table
-        station_table[station.station_id] = TransformedStation(
-            station_id=station.station_id,
-            station_name=station.station_name,
-            order=station.order,
-            line=line_color
-        )
+    and storing it in a Faust Table, BATCH_SIZE stations at a time.
+    """
+    if PARTITIONS > 1:
+        stations = stations.group_by(Station.station_id)
+
+    if BATCH_SIZE <= 1:
+        async for station in stations:
+            update_station_table([station])
+        return
+
+    async for batch in stations.take(BATCH_SIZE, within=BATCH_WITHIN):
+        written = update_station_table(batch)
+        logger.debug("wrote %d of a batch of %d stations", written, len(batch))
 
 
 if __name__ == "__main__":
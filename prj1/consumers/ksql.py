@@ -1,7 +1,11 @@
+import argparse
 import json
 import logging
+import re
+import time
+from urllib.parse import quote
+
 import requests
-import topic_check
 
 # Setup logger for detailed error and info tracking
 logger = logging.getLogger(__name__)
@@ -9,9 +13,11 @@ logger = logging.getLogger(__name__)
 # Define the KSQL URL endpoint for interaction
 KSQL_URL = "http://localhost:8088"
 
-# KSQL statement to create tables and summary for turnstile data
-KSQL_STATEMENT = """
-CREATE TABLE turnstile (
+# Every turnstile event is a row of the turnstile stream. Records of simulations run with
+# aggregated turnstiles carry the number of entries seen by a station during one tick,
+# so they are summed rather than counted.
+TURNSTILE_STREAM = """
+CREATE STREAM turnstile (
     station_id INT,
     station_name VARCHAR,
     line VARCHAR
@@ -21,44 +27,298 @@ CREATE TABLE turnstile (
     KEY = 'station_id',
     PARTITIONS = 6,  -- Increase the number of partitions to ensure better distribution of data in real-world scenarios
     REPLICAS = 3     -- Increase the number of replicas for better fault tolerance and data durability
-);
+)"""
+
+TURNSTILE_AGGREGATED_STREAM = """
+CREATE STREAM turnstile (
+    station_id INT,
+    station_name VARCHAR,
+    line VARCHAR,
+    num_entries INT
+) WITH (
+    KAFKA_TOPIC = 'org.chicago.cta.station.turnstile.v2',
+    VALUE_FORMAT = 'avro'
+)"""
+
+# Windowed summaries, by the suffix of their table name, with their window and how long
+# their windows are kept. Tumbling windows count the entries of every minute, hopping
+# windows the entries of the last hour, every five minutes. The suffix names the size of
+# the window, which the dashboard reads to tell which overlapping window spans it.
+WINDOWS = [
+    ("1m", "TUMBLING (SIZE 1 MINUTE)", "2 HOURS"),
+    ("1h", "HOPPING (SIZE 1 HOUR, ADVANCE BY 5 MINUTES)", "1 DAY"),
+]
+
+# The KSQL version of docker-compose.yaml, assumed when the server does not report one
+DEFAULT_VERSION = (5, 2)
+
+
+def supports_retention(version):
+    """
+    Returns whether a KSQL server version accepts RETENTION in window expressions and
+    exposes WINDOWSTART as a column rather than the WINDOWSTART() function, which is
+    Confluent Platform 5.5 or later. The statements target the KSQL of Confluent Platform
+    5.x: the KEY property of the turnstile stream was removed in ksqlDB 0.10.
+    """
+    return version >= (5, 5)
+
+
+def server_version():
+    """
+    Returns the (major, minor) version the KSQL server reports, or DEFAULT_VERSION.
+    """
+    try:
+        response = requests.get(f"{KSQL_URL}/info")
+        response.raise_for_status()
+        version = response.json()["KsqlServerInfo"]["version"]
+        return tuple(int(part) for part in version.split(".")[:2])
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        logger.warning(f"Unable to read the KSQL server version, assuming {DEFAULT_VERSION}: {e}")
+        return DEFAULT_VERSION
+
 
+def turnstile_statements(aggregated=False, windows=WINDOWS, version=DEFAULT_VERSION):
+    """
+    Returns the KSQL statements creating the turnstile stream and its summary tables.
+
+    TURNSTILE_SUMMARY holds the total entries of every station, and each window adds a
+    TURNSTILE_SUMMARY_<suffix> table with the entries of every station per window, along
+    with the start of the window in WINDOW_START. Servers older than 5.5 have no RETENTION
+    clause, so their windows are kept for the default window store retention of one day.
+
+    Args:
+        aggregated (bool): Sum aggregated turnstile records instead of counting events.
+        windows (list): (suffix, window expression, retention) of the windowed summaries.
+        version (tuple): The (major, minor) version of the KSQL server.
+    """
+    entries = "SUM(num_entries)" if aggregated else "COUNT(*)"
+    if supports_retention(version):
+        window_start = "WINDOWSTART"
+    else:
+        window_start = "WINDOWSTART()"
+    statements = [
+        TURNSTILE_AGGREGATED_STREAM if aggregated else TURNSTILE_STREAM,
+        f"""
 CREATE TABLE turnstile_summary
 WITH (VALUE_FORMAT = 'json') AS
-    SELECT station_id, COUNT(station_id) AS count
+    SELECT station_id, {entries} AS count
     FROM turnstile
-    GROUP BY station_id;
-"""
-# This KSQL statement will create the necessary tables and stream the data into a summary table.
-# Ensure the turnstile topic is static (not changing per station) and partition/replica settings are optimized.
+    GROUP BY station_id""",
+    ]
+    for suffix, window, retention in windows:
+        if supports_retention(version):
+            window = f"{window[:-1]}, RETENTION {retention})"
+        statements.append(f"""
+CREATE TABLE turnstile_summary_{suffix}
+WITH (VALUE_FORMAT = 'json') AS
+    SELECT station_id, {window_start} AS window_start, {entries} AS count
+    FROM turnstile
+    WINDOW {window}
+    GROUP BY station_id""")
+    return [statement.strip() + ";" for statement in statements]
+
+
+# Matches the object a CREATE statement creates
+CREATE_PATTERN = re.compile(r"^\s*CREATE\s+(STREAM|TABLE)\s+(\w+)", re.IGNORECASE)
+# Matches the topic a CREATE statement names in its WITH clause
+KAFKA_TOPIC_PATTERN = re.compile(r"\bKAFKA_TOPIC\s*=\s*'([^']+)'", re.IGNORECASE)
+
 
-def execute_ksql_statement():
+def ksql_request(session, ksql):
     """
-    Executes the KSQL statement to create and configure the KSQL tables and streams.
-    It checks if the summary table already exists to avoid re-creating it.
+    Sends KSQL statements to the KSQL server and returns its decoded response.
+
+    Args:
+        session (requests.Session): The session to send the statements with.
+        ksql (str): One or more statements, each ending with a semicolon.
     """
-    # Check if the 'TURNSTILE_SUMMARY' topic already exists to avoid duplication
-    if topic_check.topic_exists("TURNSTILE_SUMMARY"):
-        logger.info("Turnstile summary table already exists. Skipping execution.")
-        return
+    response = session.post(
+        f"{KSQL_URL}/ksql",
+        data=json.dumps({
+            "ksql": ksql,
+            "streamsProperties": {"ksql.streams.auto.offset.reset": "earliest"}
+        }),
+    )
+    if not response.ok:
+        logger.error(f"KSQL server rejected {ksql!r}: {response.text}")
+    response.raise_for_status()
+    return response.json()
 
-    logger.debug("Executing KSQL statement to create turnstile and summary tables...")
 
-    try:
-        # Send the KSQL query to the KSQL server via HTTP POST
-        response = requests.post(
-            f"{KSQL_URL}/ksql",
-            headers={"Content-Type": "application/vnd.ksql.v1+json"},
-            data=json.dumps({
-                "ksql": KSQL_STATEMENT,
-                "streamsProperties": {"ksql.streams.auto.offset.reset": "earliest"}
-            }),
-        )
-
-        # Raise an exception if the HTTP request wasn't successful
+def existing_objects(session):
+    """
+    Lists the streams, tables and persistent queries of the KSQL server in a single request.
+
+    Returns:
+        tuple: A dict of stream and table names to their kind, 'STREAM' or 'TABLE', and
+            their topic, and the list of queries.
+    """
+    objects = {}
+    queries = []
+    for result in ksql_request(session, "SHOW STREAMS; SHOW TABLES; SHOW QUERIES;"):
+        for kind, key in (("STREAM", "streams"), ("TABLE", "tables")):
+            objects.update(
+                (item["name"].upper(), (kind, item.get("topic"))) for item in result.get(key, [])
+            )
+        queries.extend(result.get("queries", []))
+    return objects, queries
+
+
+def sink_queries(queries, name):
+    """
+    Returns the persistent queries writing to the stream or table name.
+    """
+    return [
+        query for query in queries if name in (sink.upper() for sink in query.get("sinks", []))
+    ]
+
+
+def query_state(queries, name):
+    """
+    Returns 'RUNNING' if a query writing to name runs, else the state of one that does not,
+    or None if there is no such query. Servers before 5.5 do not report the state of
+    queries, so listed queries are taken to be running.
+    """
+    states = [query.get("state", "RUNNING") for query in sink_queries(queries, name)]
+    if "RUNNING" in states:
+        return "RUNNING"
+    return states[0] if states else None
+
+
+def run_command(session, ksql, timeout, poll_secs):
+    """
+    Sends a statement and waits for every command it started to succeed.
+    """
+    for result in ksql_request(session, ksql):
+        if "commandId" in result:
+            wait_for_command(session, result["commandId"], timeout, poll_secs)
+
+
+def wait_for_command(session, command_id, timeout, poll_secs):
+    """
+    Polls the status of a command until it succeeded, raising if it failed or timed out.
+    """
+    deadline = time.monotonic() + timeout
+    url = f"{KSQL_URL}/status/{quote(command_id, safe='/')}"
+    while True:
+        response = session.get(url)
         response.raise_for_status()
-        logger.info("KSQL statement executed successfully.")
+        status = response.json()
+        if status["status"] == "SUCCESS":
+            return
+        if status["status"] in ("ERROR", "TERMINATED"):
+            raise RuntimeError(f"KSQL command {command_id} failed: {status.get('message')}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"KSQL command {command_id} still {status['status']} after {timeout}s")
+        time.sleep(poll_secs)
+
+
+def wait_for_query(session, name, timeout, poll_secs):
+    """
+    Polls the persistent queries until the one writing to name is running.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        _, queries = existing_objects(session)
+        state = query_state(queries, name)
+        if state == "RUNNING":
+            return
+        if state == "ERROR":
+            raise RuntimeError(f"KSQL query writing {name} failed")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"KSQL query writing {name} not running after {timeout}s")
+        time.sleep(poll_secs)
+
+
+def drop(session, kind, name, queries, timeout, poll_secs):
+    """
+    Terminates the queries writing to a stream or table, then drops it, keeping its topic.
+    """
+    for query in sink_queries(queries, name):
+        logger.info(f"Terminating KSQL query {query['id']}")
+        run_command(session, f"TERMINATE {query['id']};", timeout, poll_secs)
+    run_command(session, f"DROP {kind} {name};", timeout, poll_secs)
+
+
+def migrate(statements, timeout=60.0, poll_secs=0.5):
+    """
+    Applies the CREATE statements whose stream or table is missing or broken, one at a time.
+
+    The existing streams, tables and queries are listed once, so statements that were
+    applied before, such as by a run that failed halfway, are skipped. A stream or table
+    created by CREATE ... AS SELECT whose query is no longer running is dropped and created
+    again. An object of the wrong kind, such as a turnstile TABLE where a STREAM is
+    declared, or on another topic than its KAFKA_TOPIC, such as the turnstile stream of
+    the other turnstile mode, cannot be replaced without losing what is built on it, so
+    it raises.
+    Every applied statement is waited on until its command succeeded and, for
+    CREATE ... AS SELECT, until its persistent query is running, so that later
+    statements can build on it.
+
+    Args:
+        statements (list): CREATE STREAM or CREATE TABLE statements, in dependency order.
+        timeout (float): Longest wait in seconds for each statement.
+        poll_secs (float): Time between status polls, in seconds.
+
+    Returns:
+        list: The names of the streams and tables created.
+    """
+    created = []
+    with requests.Session() as session:
+        session.headers["Content-Type"] = "application/vnd.ksql.v1+json"
+        objects, queries = existing_objects(session)
+        for statement in statements:
+            match = CREATE_PATTERN.match(statement)
+            if match is None:
+                raise ValueError(f"Not a CREATE STREAM or CREATE TABLE statement: {statement!r}")
+            kind, name = match.group(1).upper(), match.group(2).upper()
+            is_query = re.search(r"\bAS\s+SELECT\b", statement, re.IGNORECASE) is not None
 
+            topic = KAFKA_TOPIC_PATTERN.search(statement)
+            topic = topic.group(1) if topic is not None else None
+
+            existing_kind, existing_topic = objects.get(name, (None, None))
+            if existing_kind is not None and existing_kind != kind:
+                raise RuntimeError(
+                    f"KSQL {name} exists as a {existing_kind} but is declared as a {kind}. "
+                    f"Drop it and the tables built on it, then run this again"
+                )
+            if (
+                existing_kind is not None
+                and None not in (topic, existing_topic)
+                and existing_topic != topic
+            ):
+                raise RuntimeError(
+                    f"KSQL {kind.lower()} {name} reads topic {existing_topic} but is declared "
+                    f"on {topic}. Drop it and the tables built on it, then run this again"
+                )
+            if existing_kind is not None:
+                if not is_query or query_state(queries, name) == "RUNNING":
+                    logger.info(f"KSQL {kind.lower()} {name} already exists, skipping it")
+                    continue
+                logger.warning(f"KSQL {kind.lower()} {name} has no running query, recreating it")
+                drop(session, kind, name, queries, timeout, poll_secs)
+
+            logger.info(f"Creating KSQL {kind.lower()} {name}")
+            run_command(session, statement, timeout, poll_secs)
+            if is_query:
+                wait_for_query(session, name, timeout, poll_secs)
+            objects[name] = (kind, topic or name)
+            created.append(name)
+    return created
+
+
+def execute_ksql_statement(aggregated=False):
+    """
+    Creates whichever of the turnstile KSQL stream and tables are missing.
+
+    Args:
+        aggregated (bool): Build the summary from aggregated turnstile records. Defaults to False.
+    """
+    logger.debug("Creating turnstile stream and summary tables...")
+    try:
+        created = migrate(turnstile_statements(aggregated, version=server_version()))
+        logger.info(f"KSQL statements executed successfully, created {created or 'nothing'}.")
     except requests.exceptions.RequestException as e:
         # Log any error that occurs during the request
         logger.error(f"Error executing KSQL statement: {e}")
@@ -66,4 +326,12 @@ def execute_ksql_statement():
 
 if __name__ == "__main__":
     # Run the KSQL statement execution when the script is run directly
-    execute_ksql_statement()
+    parser = argparse.ArgumentParser(description="Creates the turnstile KSQL tables")
+    parser.add_argument(
+        "--aggregated",
+        action="store_true",
+        help="sum aggregated turnstile records from simulation.py --aggregate-turnstiles",
+    )
+    args = parser.parse_args()
+
+    execute_ksql_statement(aggregated=args.aggregated)
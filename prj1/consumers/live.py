@@ -0,0 +1,110 @@
+"""Pushes changes of the dashboard models to browsers over a WebSocket"""
+import json
+import logging
+
+import tornado.ioloop
+import tornado.websocket
+
+
+logger = logging.getLogger(__name__)
+
+
+def station_fields(line, station):
+    """Returns the fields of a station row on the status page"""
+    return {
+        "line": line.color,
+        "station_id": station.station_id,
+        "station_name": station.station_name,
+        "order": station.order,
+        "dir_a": station.train_a if station.train_a is not None else "---",
+        "dir_b": station.train_b if station.train_b is not None else "---",
+        "entries": station.num_turnstile_entries,
+        # Entries over the last window of every windowed turnstile summary
+        "window_entries": station.window_counts,
+    }
+
+
+def weather_fields(weather):
+    """Returns the weather fields shown on the status page"""
+    return {"temperature": int(weather.temperature), "status": weather.status}
+
+
+class LiveHandler(tornado.websocket.WebSocketHandler):
+    """Sends a snapshot of the models when a browser connects, then LiveUpdates frames"""
+
+    # Every open connection, written to by LiveUpdates
+    clients = set()
+
+    def initialize(self, weather, lines):
+        """Initializes the handler with required configuration"""
+        self.weather = weather
+        self.lines = lines
+
+    def open(self):
+        """Sends every station and the weather, then registers for updates"""
+        snapshot = {
+            "weather": weather_fields(self.weather),
+            "stations": [
+                station_fields(line, station)
+                for line in (self.lines.blue_line, self.lines.green_line, self.lines.red_line)
+                for station in line.ordered_stations
+            ],
+        }
+        self.write_message(json.dumps(snapshot))
+        LiveHandler.clients.add(self)
+
+    def on_close(self):
+        LiveHandler.clients.discard(self)
+
+
+class LiveUpdates:
+    """Coalesces model changes into one frame every frame_secs and pushes it to every client
+
+    A frame only holds the weather if it changed and the stations that changed since the
+    previous frame, serialized once whatever the number of clients.
+    """
+
+    def __init__(self, weather, lines, frame_secs=0.1):
+        self.weather = weather
+        self.lines = lines
+        self.frame_secs = frame_secs
+        self.frames = 0
+        self._callback = None
+
+    def start(self):
+        """Starts sending frames from the current IOLoop"""
+        self._callback = tornado.ioloop.PeriodicCallback(self.flush, self.frame_secs * 1000)
+        self._callback.start()
+        return self
+
+    def stop(self):
+        if self._callback is not None:
+            self._callback.stop()
+
+    def frame(self):
+        """Returns the changes since the previous frame, or None if nothing changed"""
+        frame = {}
+        if self.weather.changed:
+            self.weather.changed = False
+            frame["weather"] = weather_fields(self.weather)
+        stations = [
+            station_fields(line, station)
+            for line in (self.lines.blue_line, self.lines.green_line, self.lines.red_line)
+            for station in line.pop_changes()
+        ]
+        if stations:
+            frame["stations"] = stations
+        return frame or None
+
+    def flush(self):
+        """Sends the changes since the previous frame to every client"""
+        frame = self.frame()
+        if frame is None or not LiveHandler.clients:
+            return
+        message = json.dumps(frame)
+        for client in list(LiveHandler.clients):
+            try:
+                client.write_message(message)
+            except tornado.websocket.WebSocketClosedError:
+                LiveHandler.clients.discard(client)
+        self.frames += 1
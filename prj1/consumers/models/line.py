@@ -1,3 +1,6 @@
+import bisect
+from enum import IntEnum
+import functools
 import json
 import logging
 from models import Station
@@ -5,6 +8,81 @@ from models import Station
 # Logger setup for tracking issues and process flow
 logger = logging.getLogger(__name__)
 
+# The kinds of topics a line handles messages from
+topic_kinds = IntEnum("topic_kinds", "stations arrivals turnstiles turnstile_windows unknown")
+
+# Windowed turnstile summaries are named after the all-time summary, with a window suffix
+WINDOWED_SUMMARY_PREFIX = "TURNSTILE_SUMMARY_"
+
+
+@functools.lru_cache(maxsize=None)
+def classify_topic(topic):
+    """
+    Returns the kind of a topic, computed once per topic name.
+
+    Args:
+        topic (str): The name of the topic.
+
+    Returns:
+        topic_kinds: The kind of messages the topic carries.
+    """
+    if "stations.table" in topic:
+        return topic_kinds.stations
+    if "arrival" in topic:
+        return topic_kinds.arrivals
+    if topic.startswith(WINDOWED_SUMMARY_PREFIX):
+        return topic_kinds.turnstile_windows
+    if "TURNSTILE_SUMMARY" in topic:
+        return topic_kinds.turnstiles
+    return topic_kinds.unknown
+
+
+@functools.lru_cache(maxsize=None)
+def window_name(topic):
+    """
+    Returns the window of a windowed turnstile summary topic, such as '1m' for
+    TURNSTILE_SUMMARY_1M, or None for other topics.
+
+    Args:
+        topic (str): The name of the topic.
+    """
+    if not topic.startswith(WINDOWED_SUMMARY_PREFIX):
+        return None
+    return topic[len(WINDOWED_SUMMARY_PREFIX):].lower()
+
+
+# Milliseconds in each unit of a window name
+WINDOW_UNITS = {"s": 1000, "m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000}
+
+
+@functools.lru_cache(maxsize=None)
+def window_size(window):
+    """
+    Returns the size in milliseconds of a window named after its size, such as 3600000
+    for '1h', or None if the name does not give one.
+
+    Args:
+        window (str): The name of the window.
+    """
+    if not window or window[-1] not in WINDOW_UNITS or not window[:-1].isdigit():
+        return None
+    return int(window[:-1]) * WINDOW_UNITS[window[-1]]
+
+
+def decode_value(kind, message):
+    """
+    Returns the value of a message, parsing the JSON of station table and turnstile topics.
+    Arrival values are already decoded from Avro by the consumer.
+
+    Args:
+        kind (topic_kinds): The kind of the message's topic.
+        message (KafkaMessage): The Kafka message to decode.
+    """
+    if kind in (topic_kinds.stations, topic_kinds.turnstiles, topic_kinds.turnstile_windows):
+        return json.loads(message.value())
+    return message.value()
+
+
 class Line:
     """Represents a line in the system with its stations and functionalities."""
 
@@ -18,6 +96,13 @@ class Line:
         self.color = color
         self.color_code = self._get_color_code(color)
         self.stations = {}
+        # The stations sorted by order, kept sorted as they arrive, and their (order, station_id) keys
+        self.ordered_stations = []
+        self._order_keys = []
+        # Incremented whenever a message may have changed the line, so renders can be cached
+        self.version = 0
+        # Ids of the stations changed since the last call to pop_changes, for live updates
+        self.changed = set()
 
     def _get_color_code(self, color):
         """
@@ -45,16 +130,27 @@ class Line:
         """
         if station_data["line"] != self.color:
             return
-        self.stations[station_data["station_id"]] = Station.from_message(station_data)
+        station = Station.from_message(station_data)
+        prev_station = self.stations.get(station.station_id)
+        if prev_station is not None:
+            index = bisect.bisect_left(self._order_keys, (prev_station.order, prev_station.station_id))
+            del self._order_keys[index]
+            del self.ordered_stations[index]
+        self.stations[station.station_id] = station
 
-    def _handle_arrival(self, message):
+        key = (station.order, station.station_id)
+        index = bisect.bisect_left(self._order_keys, key)
+        self._order_keys.insert(index, key)
+        self.ordered_stations.insert(index, station)
+        self.changed.add(station.station_id)
+
+    def _handle_arrival(self, value):
         """
         Updates the station's data when a train arrives, including handling departures.
         
         Args:
-            message (KafkaMessage): The Kafka message containing train arrival data.
+            value (dict): The decoded train arrival data.
         """
-        value = message.value()
         prev_station_id = value.get("prev_station_id")
         prev_dir = value.get("prev_direction")
         
@@ -62,6 +158,7 @@ class Line:
             prev_station = self.stations.get(prev_station_id)
             if prev_station:
                 prev_station.handle_departure(prev_dir)
+                self.changed.add(prev_station_id)
             else:
                 logger.debug("Unable to handle previous station due to missing station.")
         else:
@@ -73,57 +170,96 @@ class Line:
         
         if station:
             station.handle_arrival(value.get("direction"), value.get("train_id"), value.get("train_status"))
+            self.changed.add(station_id)
         else:
             logger.debug(f"Unable to handle message due to missing station (ID: {station_id})")
 
-    def process_message(self, message):
+    def _handle_turnstile(self, value):
         """
-        Processes incoming Kafka messages based on their topic and updates the line's data.
-        
+        Updates a station's turnstile entries from turnstile summary data.
+
         Args:
-            message (KafkaMessage): The Kafka message to process.
+            value (dict): The decoded turnstile summary data.
         """
-        topic = message.topic()
-
-        if 'stations.table' in topic:
-            # Handle station updates from the stations table
-            self._process_station_update(message)
-        elif 'arrival' in topic:
-            # Handle train arrival updates
-            self._handle_arrival(message)
-        elif 'TURNSTILE_SUMMARY' in topic:
-            # Handle turnstile summary data
-            self._process_turnstile_summary(message)
+        station_id = value.get("STATION_ID")
+        station = self.stations.get(station_id)
+        if station:
+            station.process_message(value)
+            self.changed.add(station_id)
         else:
-            logger.debug(f"Unable to find handler for message from topic {topic}.")
+            logger.debug(f"Unable to process turnstile summary for missing station (ID: {station_id}).")
 
-    def _process_station_update(self, message):
+    def _handle_turnstile_window(self, value, window):
         """
-        Processes updates for stations and adds them to the line's station list.
-        
+        Updates a station's entries in a window from windowed turnstile summary data.
+        Windowed summaries are keyed by station and window, so the window start is read
+        from the WINDOW_START field of the value.
+
         Args:
-            message (KafkaMessage): The Kafka message containing station data.
+            value (dict): The decoded windowed turnstile summary data.
+            window (str): The name of the window, such as '1m'.
         """
-        try:
-            station_data = json.loads(message.value())
-            self._handle_station(station_data)
-        except Exception as e:
-            logger.fatal(f"Error processing station data: {e}")
+        station_id = value.get("STATION_ID")
+        station = self.stations.get(station_id)
+        if station is None:
+            logger.debug(f"Unable to process windowed turnstile summary for missing station (ID: {station_id}).")
+            return
+        if station.process_window(
+            window, value.get("WINDOW_START", 0), value.get("COUNT", 0), window_size(window)
+        ):
+            self.changed.add(station_id)
+
+    def pop_changes(self):
+        """
+        Returns the stations changed since the last call, in order, and forgets them.
 
-    def _process_turnstile_summary(self, message):
+        Returns:
+            list: The changed Station objects.
+        """
+        if not self.changed:
+            return []
+        changed = [self.stations[station_id] for station_id in self.changed if station_id in self.stations]
+        self.changed = set()
+        return sorted(changed, key=lambda station: station.order)
+
+    def process_message(self, message):
         """
-        Processes turnstile summary data and updates station information accordingly.
+        Processes incoming Kafka messages based on their topic and updates the line's data.
         
         Args:
-            message (KafkaMessage): The Kafka message containing turnstile summary data.
+            message (KafkaMessage): The Kafka message to process.
         """
+        kind = classify_topic(message.topic())
         try:
-            json_data = json.loads(message.value())
-            station_id = json_data.get("STATION_ID")
-            station = self.stations.get(station_id)
-            if station:
-                station.process_message(json_data)
-            else:
-                logger.debug(f"Unable to process turnstile summary for missing station (ID: {station_id}).")
+            value = decode_value(kind, message)
         except Exception as e:
-            logger.error(f"Error processing turnstile summary: {e}")
+            logger.error(f"Error decoding message from topic {message.topic()}: {e}")
+            return
+        self.process_value(kind, value, window_name(message.topic()))
+
+    def process_value(self, kind, value, window=None):
+        """
+        Updates the line's data from an already decoded message value.
+
+        Args:
+            kind (topic_kinds): The kind of topic the value was consumed from.
+            value (dict): The decoded message value.
+            window (str, optional): The window of windowed turnstile summaries.
+        """
+        if kind != topic_kinds.unknown:
+            self.version += 1
+
+        if kind == topic_kinds.stations:
+            # Handle station updates from the stations table
+            self._handle_station(value)
+        elif kind == topic_kinds.arrivals:
+            # Handle train arrival updates
+            self._handle_arrival(value)
+        elif kind == topic_kinds.turnstiles:
+            # Handle turnstile summary data
+            self._handle_turnstile(value)
+        elif kind == topic_kinds.turnstile_windows:
+            # Handle windowed turnstile summary data
+            self._handle_turnstile_window(value, window)
+        else:
+            logger.debug(f"Unable to find handler for message of kind {kind}.")
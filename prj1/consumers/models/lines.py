@@ -1,8 +1,8 @@
 """Contains functionality related to Lines"""
-import json
 import logging
 
 from models import Line
+from models.line import classify_topic, decode_value, topic_kinds, window_name, window_size
 
 
 
@@ -17,24 +17,57 @@ class Lines:
         self.red_line = Line("red")
         self.green_line = Line("green")
         self.blue_line = Line("blue")
+        self.lines = {
+            "red": self.red_line,
+            "green": self.green_line,
+            "blue": self.blue_line,
+        }
+        # station_id -> the Lines showing the station, for routing turnstile summaries.
+        # Transfer stations such as Clark/Lake are on more than one line
+        self.station_lines = {}
+        # Names of the windowed turnstile summaries seen so far, from the shortest window
+        self.windows = []
+
+    @property
+    def version(self):
+        """Changes whenever any line changes"""
+        return self.red_line.version + self.green_line.version + self.blue_line.version
 
     def process_message(self, message):
-        """Processes a station message"""
-        if "org.chicago.cta.station" in message.topic():
-            value = message.value()
-            if message.topic() == "org.chicago.cta.stations.table.v1":
-                value = json.loads(value)
-            if value["line"] == "green":
-                self.green_line.process_message(message)
-            elif value["line"] == "red":
-                self.red_line.process_message(message)
-            elif value["line"] == "blue":
-                self.blue_line.process_message(message)
-            else:
-                logger.debug("discarding unknown line msg %s", value["line"])
-        elif "TURNSTILE_SUMMARY" == message.topic():
-            self.green_line.process_message(message)
-            self.red_line.process_message(message)
-            self.blue_line.process_message(message)
-        else:
+        """Processes a station message, decoding its value once for the line it belongs to"""
+        kind = classify_topic(message.topic())
+        if kind == topic_kinds.unknown:
             logger.info("ignoring non-lines message %s", message.topic())
+            return
+        try:
+            value = decode_value(kind, message)
+        except Exception as e:
+            logger.error("unable to decode message from %s: %s", message.topic(), e)
+            return
+
+        if kind == topic_kinds.turnstiles or kind == topic_kinds.turnstile_windows:
+            lines = self.station_lines.get(value.get("STATION_ID"), ())
+            if not lines:
+                logger.debug("discarding turnstile summary of unknown station")
+            window = window_name(message.topic())
+            if lines and window is not None and window not in self.windows:
+                self.windows.append(window)
+                self.windows.sort(key=lambda name: (window_size(name) or 0, name))
+            for line in lines:
+                line.process_value(kind, value, window)
+            return
+
+        line = self.lines.get(value["line"])
+        if line is None:
+            logger.debug("discarding unknown line msg %s", value["line"])
+            return
+        if kind == topic_kinds.stations:
+            lines = self.station_lines.setdefault(value["station_id"], [])
+            if line not in lines:
+                lines.append(line)
+        line.process_value(kind, value)
+
+    def process_messages(self, messages):
+        """Processes a batch of station messages"""
+        for message in messages:
+            self.process_message(message)
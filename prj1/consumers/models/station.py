@@ -1,15 +1,48 @@
-import json
 import logging
+import sys
 
 # Logger setup for tracking station-related events
 logger = logging.getLogger(__name__)
 
+# Raw train status -> the status shown, shared by every station
+_display_statuses = {}
+
+
+def display_status(train_status):
+    """
+    Returns the readable form of a train status, computed once per status.
+
+    Args:
+        train_status (str): The train status of an arrival, such as 'on_time'.
+    """
+    status = _display_statuses.get(train_status)
+    if status is None:
+        status = _display_statuses[train_status] = sys.intern(train_status.replace("_", " "))
+    return status
+
+
 class Station:
     """
     Represents a station with attributes like its ID, name, order,
     and the current status of trains in two directions (a and b).
+
+    Stations are kept in __slots__ and store the train ids and statuses of the two directions
+    as interned strings, so a dashboard of many stations stays small and arrivals allocate nothing.
     """
 
+    __slots__ = (
+        "station_id",
+        "station_name",
+        "order",
+        "train_a",
+        "status_a",
+        "train_b",
+        "status_b",
+        "num_turnstile_entries",
+        "window_entries",
+        "version",
+    )
+
     def __init__(self, station_id, station_name, order):
         """
         Initializes the Station instance.
@@ -22,9 +55,13 @@ class Station:
         self.station_id = station_id
         self.station_name = station_name
         self.order = order
-        self.dir_a = None  # Direction A status (for trains coming in this direction)
-        self.dir_b = None  # Direction B status (for trains coming in this direction)
+        self.train_a = None  # Id of the train in direction A, None when there is none
+        self.status_a = None  # Readable status of the train in direction A
+        self.train_b = None  # Id of the train in direction B, None when there is none
+        self.status_b = None  # Readable status of the train in direction B
         self.num_turnstile_entries = 0  # Tracks the number of turnstile entries
+        self.window_entries = None  # window -> {window start: entries}, once a window is seen
+        self.version = 0  # Incremented on every change, so serialized copies can be reused
 
     @classmethod
     def from_message(cls, value):
@@ -39,6 +76,20 @@ class Station:
         """
         return cls(value["station_id"], value["station_name"], value["order"])
 
+    @property
+    def dir_a(self):
+        """The train in direction A as a dict of its train_id and status, or None"""
+        if self.train_a is None:
+            return None
+        return {"train_id": self.train_a, "status": self.status_a}
+
+    @property
+    def dir_b(self):
+        """The train in direction B as a dict of its train_id and status, or None"""
+        if self.train_b is None:
+            return None
+        return {"train_id": self.train_b, "status": self.status_b}
+
     def handle_departure(self, direction):
         """
         Handles the departure of a train by clearing its data for the given direction.
@@ -47,9 +98,10 @@ class Station:
             direction (str): The direction the train is departing from, 'a' or 'b'.
         """
         if direction == "a":
-            self.dir_a = None  # Clear the train data for direction A
+            self.train_a = self.status_a = None  # Clear the train data for direction A
         else:
-            self.dir_b = None  # Clear the train data for direction B
+            self.train_b = self.status_b = None  # Clear the train data for direction B
+        self.version += 1
 
     def handle_arrival(self, direction, train_id, train_status):
         """
@@ -60,14 +112,13 @@ class Station:
             train_id (str): The unique ID of the arriving train.
             train_status (str): The current status of the arriving train.
         """
-        status_dict = {
-            "train_id": train_id,
-            "status": train_status.replace("_", " ")  # Clean up train status for readability
-        }
+        train_id = sys.intern(train_id)
+        status = display_status(train_status)
         if direction == "a":
-            self.dir_a = status_dict  # Store arrival details for direction A
+            self.train_a, self.status_a = train_id, status  # Store arrival details for direction A
         else:
-            self.dir_b = status_dict  # Store arrival details for direction B
+            self.train_b, self.status_b = train_id, status  # Store arrival details for direction B
+        self.version += 1
 
     def process_message(self, json_data):
         """
@@ -77,3 +128,53 @@ class Station:
             json_data (dict): The JSON data containing turnstile information.
         """
         self.num_turnstile_entries = json_data.get("COUNT", 0)  # Update turnstile count
+        self.version += 1
+
+    def process_window(self, window, window_start, count, size=None):
+        """
+        Updates the turnstile entries of the station in a window of a windowed summary.
+
+        Hopping windows overlap, so every entry updates several of them and the latest one
+        only holds the entries since it started. The windows that still cover the latest
+        window start are kept, and window_counts reports the oldest of them, which spans
+        about size. Updates of windows that no longer cover it are ignored.
+
+        Args:
+            window (str): The name of the window, such as '1m'.
+            window_start (int): The start of the window, in milliseconds since the epoch.
+            count (int): The entries of the station in the window.
+            size (int, optional): The size of the window in milliseconds. Without it only
+                the latest window is kept, as for tumbling windows.
+
+        Returns:
+            bool: Whether the update changed the station.
+        """
+        if self.window_entries is None:
+            self.window_entries = {}
+        starts = self.window_entries.get(window)
+        if starts is None:
+            starts = self.window_entries[window] = {}
+        latest = max(starts) if starts else window_start
+        if window_start > latest:
+            latest = window_start
+            for start in [start for start in starts if not self._covers(start, latest, size)]:
+                del starts[start]
+        elif not self._covers(window_start, latest, size):
+            return False
+        starts[window_start] = count
+        self.version += 1
+        return True
+
+    @staticmethod
+    def _covers(start, latest, size):
+        """Returns whether the window starting at start covers the latest window start"""
+        if size is None:
+            return start == latest
+        return start > latest - size
+
+    @property
+    def window_counts(self):
+        """The entries of the station in the oldest window kept of every windowed summary"""
+        return {
+            window: starts[min(starts)] for window, starts in (self.window_entries or {}).items()
+        }
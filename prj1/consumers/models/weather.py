@@ -15,6 +15,8 @@ class Weather:
         """
         self.temperature = 70.0  # Default temperature in Fahrenheit
         self.status = "sunny"  # Default weather status
+        self.version = 0  # Incremented on every weather update, so renders can be cached
+        self.changed = False  # Set on every weather update until live updates are sent
 
     def process_message(self, message):
         """
@@ -24,12 +26,17 @@ class Weather:
             message (KafkaMessage): The Kafka message containing weather data.
         """
         try:
-            # Parse the incoming message (assumed to be in JSON format)
-            data = json.loads(message.value())
+            # The weather topic is Avro, so the consumer has already decoded the value.
+            # JSON encoded values are parsed
+            data = message.value()
+            if isinstance(data, (str, bytes)):
+                data = json.loads(data)
 
             # Safely extract and update temperature and status from the incoming data
             self.temperature = data.get('temperature', self.temperature)  # Use current value if missing
             self.status = data.get('status', self.status)  # Use current value if missing
+            self.version += 1
+            self.changed = True
 
             logger.info(f"Weather updated: {self.status} with temperature {self.temperature}°F")
         except json.JSONDecodeError as e:
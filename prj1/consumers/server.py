@@ -1,4 +1,5 @@
 """Defines a Tornado Server that consumes Kafka Event data for display"""
+import hashlib
 import logging
 import logging.config
 from pathlib import Path
@@ -12,7 +13,9 @@ import tornado.web
 logging.config.fileConfig(f"{Path(__file__).parents[0]}/logging.ini")
 
 
-from consumer import KafkaConsumer
+from consumer import MultiplexConsumer, Route
+from live import LiveHandler, LiveUpdates
+from state import StateHandler, StateSnapshot, StationHandler
 from models import Lines, Weather
 import topic_check
 
@@ -21,11 +24,20 @@ logger = logging.getLogger(__name__)
 
 
 class MainHandler(tornado.web.RequestHandler):
-    """Defines a web request handler class"""
+    """Defines a web request handler class
+
+    The page is only rendered again once the weather or lines models change, and is
+    served with an ETag so viewers that already have it get a 304.
+    """
 
     template_dir = tornado.template.Loader(f"{Path(__file__).parents[0]}/templates")
     template = template_dir.load("status.html")
 
+    # The (weather, lines) versions of the cached page, the page and its ETag
+    rendered_version = None
+    rendered = None
+    rendered_etag = None
+
     def initialize(self, weather, lines):
         """Initializes the handler with required configuration"""
         self.weather = weather
@@ -33,10 +45,19 @@ class MainHandler(tornado.web.RequestHandler):
 
     def get(self):
         """Responds to get requests"""
-        logging.debug("rendering and writing handler template")
-        self.write(
-            MainHandler.template.generate(weather=self.weather, lines=self.lines)
-        )
+        version = (self.weather.version, self.lines.version)
+        if version != MainHandler.rendered_version:
+            logging.debug("rendering handler template")
+            MainHandler.rendered = MainHandler.template.generate(
+                weather=self.weather, lines=self.lines
+            )
+            MainHandler.rendered_etag = f'"{hashlib.sha1(MainHandler.rendered).hexdigest()}"'
+            MainHandler.rendered_version = version
+        self.write(MainHandler.rendered)
+
+    def compute_etag(self):
+        """Returns the ETag of the cached page rather than hashing it on every request"""
+        return MainHandler.rendered_etag
 
 
 def run_server():
@@ -55,34 +76,59 @@ def run_server():
     weather_model = Weather()
     lines = Lines()
 
+    snapshot = StateSnapshot(weather_model, lines)
     application = tornado.web.Application(
-        [(r"/", MainHandler, {"weather": weather_model, "lines": lines})]
+        [
+            (r"/", MainHandler, {"weather": weather_model, "lines": lines}),
+            (r"/live", LiveHandler, {"weather": weather_model, "lines": lines}),
+            (r"/api/state", StateHandler, {"snapshot": snapshot}),
+            (r"/api/stations/([0-9]+)", StationHandler, {"snapshot": snapshot}),
+        ],
+        compress_response=True,
     )
     application.listen(8888)
+    live_updates = LiveUpdates(weather_model, lines).start()
 
-    # Build kafka consumers
+    # A single client consumes every dashboard topic. Station updates and arrivals come in
+    # bursts, so they are handled in batches
     consumers = [
-        KafkaConsumer(
-            "org.chicago.cta.weather.v1",
-            weather_model.process_message,
-            offset_earliest=True,
-        ),
-        KafkaConsumer(
-            "org.chicago.cta.stations.table.v1",
-            lines.process_message,
-            offset_earliest=True,
-            is_avro=False,
-        ),
-        KafkaConsumer(
-            "^org.chicago.cta.station.arrivals.",
-            lines.process_message,
-            offset_earliest=True,
-        ),
-        KafkaConsumer(
-            "TURNSTILE_SUMMARY",
-            lines.process_message,
-            offset_earliest=True,
-            is_avro=False,
+        MultiplexConsumer(
+            "org.chicago.cta.dashboard",
+            [
+                Route(
+                    "org.chicago.cta.weather.v1",
+                    weather_model.process_message,
+                    offset_earliest=True,
+                ),
+                Route(
+                    "org.chicago.cta.stations.table.v1",
+                    lines.process_message,
+                    lines.process_messages,
+                    is_avro=False,
+                    offset_earliest=True,
+                ),
+                Route(
+                    "^org.chicago.cta.station.arrivals.",
+                    lines.process_message,
+                    lines.process_messages,
+                    offset_earliest=True,
+                ),
+                Route(
+                    "TURNSTILE_SUMMARY",
+                    lines.process_message,
+                    lines.process_messages,
+                    is_avro=False,
+                    offset_earliest=True,
+                ),
+                Route(
+                    "^TURNSTILE_SUMMARY_",
+                    lines.process_message,
+                    lines.process_messages,
+                    is_avro=False,
+                    offset_earliest=True,
+                ),
+            ],
+            batch_size=100,
         ),
     ]
 
@@ -96,6 +142,7 @@ def run_server():
         tornado.ioloop.IOLoop.current().start()
     except KeyboardInterrupt as e:
         logger.info("shutting down server")
+        live_updates.stop()
         tornado.ioloop.IOLoop.current().stop()
         for consumer in consumers:
             consumer.close()
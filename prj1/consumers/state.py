@@ -0,0 +1,129 @@
+"""Serves the dashboard models as JSON"""
+import json
+import logging
+import time
+
+import tornado.web
+
+from live import station_fields, weather_fields
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(value):
+    """Encodes a value as compact JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+class StateSnapshot:
+    """JSON snapshots of the weather and lines models, updated incrementally
+
+    Every station is encoded on its own and the encoding is kept until the station
+    changes, so a snapshot after a few arrivals only encodes the stations they touched
+    before joining the cached pieces.
+    """
+
+    def __init__(self, weather, lines):
+        self.weather = weather
+        self.lines = lines
+        # (line color, station_id) -> (station, station version, encoded station)
+        self.fragments = {}
+        self.state = None
+        self.etag = None
+        self.encoded = 0
+        self._version = None
+        # Distinguishes ETags across server restarts, when the versions start over
+        self._boot = f"{time.time():.0f}"
+
+    def _lines(self):
+        return (self.lines.blue_line, self.lines.green_line, self.lines.red_line)
+
+    def refresh(self):
+        """Brings the snapshot up to date with the models, if they changed"""
+        version = (self.weather.version, self.lines.version)
+        if version == self._version:
+            return
+        parts = [b'{"weather":', dumps(weather_fields(self.weather)), b',"lines":{']
+        for i, line in enumerate(self._lines()):
+            if i > 0:
+                parts.append(b",")
+            parts.append(b'"%s":[' % line.color.encode("utf-8"))
+            parts.append(b",".join(self._fragment(line, station) for station in line.ordered_stations))
+            parts.append(b"]")
+        parts.append(b"}}")
+        self.state = b"".join(parts)
+        self.etag = f'"{self._boot}-{version[0]}-{version[1]}"'
+        self._version = version
+
+    def _fragment(self, line, station):
+        """Returns the encoded station, encoding it again only if it changed"""
+        key = (line.color, station.station_id)
+        cached = self.fragments.get(key)
+        if cached is not None and cached[0] is station and cached[1] == station.version:
+            return cached[2]
+        fragment = dumps(station_fields(line, station))
+        self.fragments[key] = (station, station.version, fragment)
+        self.encoded += 1
+        return fragment
+
+    def station(self, station_id):
+        """Returns the encoded station on every line it is on, or None if it is unknown"""
+        self.refresh()
+        lines = self.lines.station_lines.get(station_id)
+        if not lines:
+            return None
+        fragments = [
+            self.fragments[(line.color, station_id)]
+            for line in lines
+            if (line.color, station_id) in self.fragments
+        ]
+        return b'{"station_id":%d,"lines":[%s]}' % (
+            station_id,
+            b",".join(fragment for _, _, fragment in fragments),
+        )
+
+
+class StateHandler(tornado.web.RequestHandler):
+    """Serves the weather and every station of every line as JSON"""
+
+    def initialize(self, snapshot):
+        """Initializes the handler with required configuration"""
+        self.snapshot = snapshot
+
+    def get(self):
+        """Responds to get requests"""
+        self.snapshot.refresh()
+        self.set_header("Content-Type", "application/json")
+        self.write(self.snapshot.state)
+
+    def compute_etag(self):
+        """Returns the ETag of the snapshot, which changes with the models"""
+        return self.snapshot.etag
+
+
+class StationHandler(tornado.web.RequestHandler):
+    """Serves one station as JSON, with its state on every line it is on"""
+
+    def initialize(self, snapshot):
+        """Initializes the handler with required configuration"""
+        self.snapshot = snapshot
+
+    def get(self, station_id):
+        """Responds to get requests"""
+        station = self.snapshot.station(int(station_id))
+        if station is None:
+            raise tornado.web.HTTPError(404, f"unknown station {station_id}")
+        self.set_header("Content-Type", "application/json")
+        self.write(station)
+
+    def compute_etag(self):
+        """Returns the ETag of the snapshot, which changes with the models"""
+        return self.snapshot.etag
@@ -0,0 +1,91 @@
+"""Tests of the windowed turnstile entries the dashboard keeps for every station"""
+import json
+from pathlib import Path
+import sys
+
+sys.path.insert(0, f"{Path(__file__).parents[1]}")
+
+from models import Lines, Station
+from models.line import window_size
+
+
+MINUTE = 60 * 1000
+HOUR = 60 * MINUTE
+
+
+class Message:
+    """The parts of a Kafka message the Lines model reads"""
+
+    def __init__(self, topic, value):
+        self._topic = topic
+        self._value = value
+
+    def topic(self):
+        return self._topic
+
+    def value(self):
+        return self._value
+
+
+def hopping_updates(entry_times, size=HOUR, advance=5 * MINUTE):
+    """Returns the (window start, count) updates KSQL emits for entries at entry_times"""
+    counts = {}
+    updates = []
+    for time in entry_times:
+        first = (time - size) // advance * advance + advance
+        for start in range(max(first, 0), time + 1, advance):
+            counts[start] = counts.get(start, 0) + 1
+            updates.append((start, counts[start]))
+    return updates
+
+
+def test_window_size():
+    assert window_size("1m") == MINUTE
+    assert window_size("1h") == HOUR
+    assert window_size("90s") == 90 * 1000
+    assert window_size("summary") is None
+
+
+def test_tumbling_window_keeps_the_latest_window():
+    station = Station(40380, "Clark/Lake", 1)
+    assert station.process_window("1m", 0, 3, MINUTE)
+    assert station.process_window("1m", MINUTE, 1, MINUTE)
+    assert not station.process_window("1m", 0, 4, MINUTE)
+    assert station.window_counts == {"1m": 1}
+
+
+def test_hopping_window_counts_the_last_hour():
+    # One entry every minute for three hours, each updating twelve overlapping windows
+    entry_times = [minute * MINUTE for minute in range(3 * 60)]
+    station = Station(40380, "Clark/Lake", 1)
+    for start, count in hopping_updates(entry_times):
+        station.process_window("1h", start, count, HOUR)
+
+    # The newest window started at 175 minutes and only holds 5 entries, while the
+    # oldest window still covering it started at 120 minutes and holds the last hour
+    assert max(station.window_entries["1h"]) == 175 * MINUTE
+    assert station.window_counts == {"1h": 60}
+    assert len(station.window_entries["1h"]) == 12
+
+
+def test_hopping_window_ignores_late_updates_of_old_windows():
+    station = Station(40380, "Clark/Lake", 1)
+    station.process_window("1h", 120 * MINUTE, 50, HOUR)
+    station.process_window("1h", 175 * MINUTE, 2, HOUR)
+    assert not station.process_window("1h", 115 * MINUTE, 61, HOUR)
+    assert station.process_window("1h", 120 * MINUTE, 51, HOUR)
+    assert station.window_counts == {"1h": 51}
+
+
+def test_lines_route_windows_to_stations():
+    lines = Lines()
+    station = {"station_id": 40380, "station_name": "Clark/Lake", "order": 1, "line": "blue"}
+    lines.process_message(Message("org.chicago.cta.stations.table.v1", json.dumps(station)))
+    for start, count in hopping_updates([minute * MINUTE for minute in range(90)]):
+        value = {"STATION_ID": 40380, "WINDOW_START": start, "COUNT": count}
+        lines.process_message(Message("TURNSTILE_SUMMARY_1H", json.dumps(value)))
+    value = {"STATION_ID": 40380, "WINDOW_START": 89 * MINUTE, "COUNT": 1}
+    lines.process_message(Message("TURNSTILE_SUMMARY_1M", json.dumps(value)))
+
+    assert lines.windows == ["1m", "1h"]
+    assert lines.blue_line.stations[40380].window_counts == {"1h": 60, "1m": 1}
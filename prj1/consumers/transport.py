@@ -0,0 +1,62 @@
+"""Transports build the Kafka clients used by the consumers"""
+import logging
+
+from confluent_kafka import Consumer
+from confluent_kafka.avro import AvroConsumer, CachedSchemaRegistryClient
+from confluent_kafka.avro.serializer import SerializerError
+from confluent_kafka.avro.serializer.message_serializer import MessageSerializer
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchAvroConsumer(AvroConsumer):
+    """An AvroConsumer that also decodes the messages returned by consume"""
+
+    def consume(self, num_messages=1, timeout=-1):
+        """Returns up to num_messages decoded messages, like repeated calls to poll
+
+        A message that cannot be decoded is logged and left out, so that it does not
+        cost the rest of the batch.
+        """
+        messages = []
+        for message in super().consume(num_messages=num_messages, timeout=timeout):
+            if message.error():
+                messages.append(message)
+                continue
+            try:
+                if message.value() is not None:
+                    message.set_value(self._serializer.decode_message(message.value()))
+                if message.key() is not None:
+                    message.set_key(
+                        self._serializer.decode_message(message.key(), is_key=True)
+                    )
+            except SerializerError as e:
+                logger.error(
+                    "Message deserialization failed for message at %s [%s] offset %s: %s",
+                    message.topic(),
+                    message.partition(),
+                    message.offset(),
+                    e,
+                )
+                continue
+            messages.append(message)
+        return messages
+
+
+class KafkaTransport:
+    """Builds confluent-kafka consumers that talk to a real broker and schema registry
+
+    Another transport, such as an in-memory broker, can be installed on KafkaConsumer to
+    run the consumers without Kafka.
+    """
+
+    def consumer(self, config, is_avro):
+        """Returns a Consumer-compatible client, decoding Avro messages if is_avro"""
+        if is_avro:
+            return BatchAvroConsumer(config)
+        return Consumer(config)
+
+    def avro_decoder(self, url):
+        """Returns a MessageSerializer that decodes Avro keys and values with the registry at url"""
+        return MessageSerializer(CachedSchemaRegistryClient({"url": url}))
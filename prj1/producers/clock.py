@@ -0,0 +1,119 @@
+"""Defines the asyncio clock that drives the simulation ticks"""
+import asyncio
+from enum import IntEnum
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class TickLag:
+    """Tracks how far behind its schedule each tick of the clock started"""
+
+    def __init__(self, tolerance=0.0):
+        self.tolerance = tolerance
+        self.ticks = 0
+        self.late_ticks = 0
+        self.last = 0.0
+        self.max = 0.0
+        self.total = 0.0
+
+    def record(self, lag):
+        """Records the lag, in seconds, of a single tick"""
+        self.ticks += 1
+        self.last = lag
+        self.total += lag
+        if lag > self.tolerance:
+            self.late_ticks += 1
+        self.max = max(self.max, lag)
+
+    def stats(self):
+        """Returns the tick count and lag figures in seconds"""
+        return {
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+            "last_lag": self.last,
+            "max_lag": self.max,
+            "mean_lag": self.total / self.ticks if self.ticks else 0.0,
+        }
+
+
+class SimulationClock:
+    """Advances simulated time on a schedule without drifting by the work done per tick
+
+    In fixed rate mode every tick is scheduled against the start of the run, so the time
+    spent producing is subtracted from the sleep, and ticks that fall behind are run back to
+    back until the clock has caught up. The dilation factor divides the wall time between
+    ticks, so a dilation of 10 runs the simulation ten times faster than the configured
+    rate. Replay mode ignores wall time and runs ticks as fast as possible.
+    """
+
+    modes = IntEnum("modes", "fixed_rate replay", start=0)
+
+    def __init__(
+        self,
+        start_time,
+        time_step,
+        sleep_seconds,
+        mode=modes.fixed_rate,
+        dilation=1.0,
+        log_every=100,
+    ):
+        if dilation <= 0:
+            raise ValueError(f"dilation must be positive, got {dilation}")
+        self.curr_time = start_time
+        self.time_step = time_step
+        self.mode = mode
+        self.dilation = dilation
+        self.tick_seconds = sleep_seconds / dilation
+        self.log_every = log_every
+        # A tick is late once it starts after the slot of the next tick has begun
+        self.lag = TickLag(tolerance=self.tick_seconds)
+
+    async def run(self, tick, max_ticks=None):
+        """Calls tick with the simulated time on every tick, until max_ticks if given
+
+        tick may be a plain function or a coroutine function.
+        """
+        started = time.monotonic()
+        num_ticks = 0
+        while max_ticks is None or num_ticks < max_ticks:
+            if self.mode == SimulationClock.modes.replay:
+                self.lag.record(0.0)
+            else:
+                deadline = started + num_ticks * self.tick_seconds
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.lag.record(max(time.monotonic() - deadline, 0.0))
+
+            result = tick(self.curr_time)
+            if asyncio.iscoroutine(result):
+                await result
+            if self.mode == SimulationClock.modes.replay:
+                # Give other tasks on the loop a chance to run between replayed ticks
+                await asyncio.sleep(0)
+
+            self.curr_time = self.curr_time + self.time_step
+            num_ticks += 1
+            if self.log_every and num_ticks % self.log_every == 0:
+                self.log_stats()
+
+    def stats(self):
+        """Returns the tick-lag metrics of the clock"""
+        return self.lag.stats()
+
+    def log_stats(self):
+        """Logs the tick-lag metrics of the clock"""
+        stats = self.stats()
+        logger.info(
+            "clock %s x%s: %d ticks, %d late, lag last %.3fs, max %.3fs, mean %.3fs",
+            self.mode.name,
+            self.dilation,
+            stats["ticks"],
+            stats["late_ticks"],
+            stats["last_lag"],
+            stats["max_lag"],
+            stats["mean_lag"],
+        )
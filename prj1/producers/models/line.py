@@ -4,6 +4,8 @@ from enum import IntEnum
 import logging
 
 from models import Station, Train
+from models.producer import Producer
+from models.turnstile_bank import TurnstileBank
 
 
 logger = logging.getLogger(__name__)
@@ -15,12 +17,30 @@ class Line:
     colors = IntEnum("colors", "blue green red", start=0)
     num_directions = 2
 
-    def __init__(self, color, station_data, num_trains=10):
+    def __init__(
+        self,
+        color,
+        station_data,
+        num_trains=10,
+        aggregate_turnstiles=False,
+        month_beginning=None,
+    ):
         self.color = color
         self.num_trains = num_trains
+        self.aggregate_turnstiles = aggregate_turnstiles
+        self.month_beginning = month_beginning
         self.stations = self._build_line_data(station_data)
+        # Create the topics of every station in one batch before trains start arriving
+        Producer.provision_topics()
+        self.turnstile_bank = TurnstileBank(self.stations, month_beginning)
         # We must always discount the terminal station at the end of each direction
         self.num_stations = len(self.stations) - 1
+        # [train, station index, b direction] of every train, in the order trains are
+        # advanced: from the start of direction b, around the loop through direction a.
+        # A tick then visits the trains rather than every station between them, and the
+        # list, not the station slots, says where a train is, so on a crowded line a
+        # train cannot overwrite the one just ahead of it
+        self.train_positions = collections.deque()
         self.trains = self._build_trains()
 
     def _build_line_data(self, station_df):
@@ -29,7 +49,13 @@ class Line:
 
         station_data = station_df[station_df["station_name"] == stations[0]]
         line = [
-            Station(station_data["station_id"].unique()[0], stations[0], self.color)
+            Station(
+                station_data["station_id"].unique()[0],
+                stations[0],
+                self.color,
+                aggregate_turnstiles=self.aggregate_turnstiles,
+                month_beginning=self.month_beginning,
+            )
         ]
         prev_station = line[0]
         for station in stations[1:]:
@@ -39,12 +65,22 @@ class Line:
                 station,
                 self.color,
                 prev_station,
+                aggregate_turnstiles=self.aggregate_turnstiles,
+                month_beginning=self.month_beginning,
             )
             prev_station.dir_b = new_station
             prev_station = new_station
             line.append(new_station)
         return line
 
+    def _train_prefix(self):
+        """Returns the prefix of train ids, the line's initial unless lines share initials"""
+        initials = {color.name[0] for color in type(self.color)}
+        if len(initials) == len(type(self.color)):
+            return self.color.name[0].upper()
+        # Synthetic lines are all named line_<index>, so their full names are used
+        return self.color.name.upper()
+
     def _build_trains(self):
         """Constructs and assigns train objects to stations"""
         trains = []
@@ -52,17 +88,19 @@ class Line:
         b_dir = True
         for train_id in range(self.num_trains):
             tid = str(train_id).zfill(3)
-            train = Train(
-                f"{self.color.name[0].upper()}L{tid}", Train.status.in_service
-            )
+            train = Train(f"{self._train_prefix()}L{tid}", Train.status.in_service)
             trains.append(train)
 
             if b_dir:
                 self.stations[curr_loc].arrive_b(train, None, None)
             else:
                 self.stations[curr_loc].arrive_a(train, None, None)
+            self.train_positions.append([train, curr_loc, b_dir])
             curr_loc, b_dir = self._get_next_idx(curr_loc, b_dir)
 
+        self.train_positions = collections.deque(
+            sorted(self.train_positions, key=self._loop_position)
+        )
         return trains
 
     def run(self, timestamp, time_step):
@@ -76,23 +114,25 @@ class Line:
 
     def _advance_turnstiles(self, timestamp, time_step):
         """Advances the turnstiles in the simulation"""
-        _ = [station.turnstile.run(timestamp, time_step) for station in self.stations]
+        entries = self.turnstile_bank.get_entries(timestamp, time_step)
+        for station, num_entries in zip(self.stations, entries):
+            station.turnstile.run(timestamp, time_step, num_entries=int(num_entries))
 
     def _advance_trains(self):
-        """Advances trains between stations in the simulation"""
-        # Find the first b train
-        curr_train, curr_index, b_direction = self._next_train()
-        self.stations[curr_index].b_train = None
-
-        trains_advanced = 0
-        while trains_advanced < self.num_trains - 1:
-            # The train departs the current station
+        """Advances every train one station along the loop, in a single pass"""
+        for position in self.train_positions:
+            train, curr_index, b_direction = position
+
+            # The train departs the current station, unless a train close behind it on a
+            # crowded line has already arrived there
+            station = self.stations[curr_index]
             if b_direction is True:
-                self.stations[curr_index].b_train = None
-            else:
-                self.stations[curr_index].a_train = None
+                if station.b_train is train:
+                    station.b_train = None
+            elif station.a_train is train:
+                station.a_train = None
 
-            prev_station = self.stations[curr_index].station_id
+            prev_station = station.station_id
             prev_dir = "b" if b_direction else "a"
 
             # Advance this train to the next station
@@ -100,72 +140,23 @@ class Line:
                 curr_index, b_direction, step_size=1
             )
             if b_direction is True:
-                self.stations[curr_index].arrive_b(curr_train, prev_station, prev_dir)
-            else:
-                self.stations[curr_index].arrive_a(curr_train, prev_station, prev_dir)
-
-            # Find the next train to advance
-            move = 1 if b_direction else -1
-            next_train, curr_index, b_direction = self._next_train(
-                curr_index + move, b_direction
-            )
-            if b_direction is True:
-                curr_train = self.stations[curr_index].b_train
+                self.stations[curr_index].arrive_b(train, prev_station, prev_dir)
             else:
-                curr_train = self.stations[curr_index].a_train
-
-            curr_train = next_train
-            trains_advanced += 1
-
-        # The last train departs the current station
-        if b_direction is True:
-            self.stations[curr_index].b_train = None
-        else:
-            self.stations[curr_index].a_train = None
-
-        # Advance last train to the next station
-        prev_station = self.stations[curr_index].station_id
-        prev_dir = "b" if b_direction else "a"
-        curr_index, b_direction = self._get_next_idx(
-            curr_index, b_direction, step_size=1
-        )
-        if b_direction is True:
-            self.stations[curr_index].arrive_b(curr_train, prev_station, prev_dir)
-        else:
-            self.stations[curr_index].arrive_a(curr_train, prev_station, prev_dir)
-
-    def _next_train(self, start_index=0, b_direction=True, step_size=1):
-        """Given a starting index, finds the next train in either direction"""
-        if b_direction is True:
-            curr_index = self._next_train_b(start_index, step_size)
-
-            if curr_index == -1:
-                curr_index = self._next_train_a(len(self.stations) - 1, step_size)
-                b_direction = False
-        else:
-            curr_index = self._next_train_a(start_index, step_size)
-
-            if curr_index == -1:
-                curr_index = self._next_train_b(0, step_size)
-                b_direction = True
-
+                self.stations[curr_index].arrive_a(train, prev_station, prev_dir)
+            position[1], position[2] = curr_index, b_direction
+
+        # A train that wrapped around from direction a to the start of direction b is now
+        # the first one along the loop
+        last = self.train_positions[-1] if self.train_positions else None
+        if last is not None and self._loop_position(last) == 0:
+            self.train_positions.rotate(1)
+
+    def _loop_position(self, position):
+        """Returns how far along the loop, starting with direction b, a train position is"""
+        _, index, b_direction = position
         if b_direction is True:
-            return self.stations[curr_index].b_train, curr_index, True
-        return self.stations[curr_index].a_train, curr_index, False
-
-    def _next_train_b(self, start_index, step_size):
-        """Finds the next train in the b direction, if any"""
-        for i in range(start_index, len(self.stations), step_size):
-            if self.stations[i].b_train is not None:
-                return i
-        return -1
-
-    def _next_train_a(self, start_index, step_size):
-        """Finds the next train in the a direction, if any"""
-        for i in range(start_index, 0, -step_size):
-            if self.stations[i].a_train is not None:
-                return i
-        return -1
+            return index
+        return 2 * self.num_stations - index
 
     def _get_next_idx(self, curr_index, b_direction, step_size=None):
         """Calculates the next station index. Returns next index and if it is b direction"""
@@ -1,20 +1,272 @@
 """Producer base-class providing common utilites and functionality"""
+import collections
 import logging
+import threading
 import time
 
-from confluent_kafka import avro
-from confluent_kafka.admin import AdminClient
-from confluent_kafka.cimpl import NewTopic
-from confluent_kafka.avro import AvroProducer, CachedSchemaRegistryClient
+from confluent_kafka import avro, KafkaError, KafkaException
+from confluent_kafka.admin import ConfigResource
+from confluent_kafka.cimpl import NewPartitions, NewTopic
+
+from models.serializer import CachedAvroSerializer
+from models.transport import KafkaTransport
 
 logger = logging.getLogger(__name__)
 
 
+class PooledProducer:
+    """A reference-counted AvroProducer shared by every Producer with the same config"""
+
+    def __init__(self, broker_url, schema_registry_url, transport):
+        self.broker_url = broker_url
+        self.schema_registry_url = schema_registry_url
+        self.refcount = 0
+        self.produced = collections.Counter()
+        self.delivered = collections.Counter()
+        self.failed = collections.Counter()
+        self.serializers = {}
+        self.transport = transport
+
+        self.schema_registry = transport.schema_registry(schema_registry_url)
+        self.config = {
+            "bootstrap.servers": broker_url,  # for docker -> 29092
+            "on_delivery": self._on_delivery,
+        }
+        # Schemas are always passed per-message, so no default schemas are configured here
+        self.client = transport.producer(self.config, self.schema_registry)
+        # Plain client for pre-encoded messages, built on the first produce_raw
+        self.raw_client = None
+
+    def produce(self, **kwargs):
+        """Produces a message on the shared client and records it against its topic"""
+        self.client.produce(**kwargs)
+        self.produced[kwargs["topic"]] += 1
+        # Serve delivery callbacks so the local queue never fills up
+        self.client.poll(0)
+
+    def produce_raw(self, topic, key, value):
+        """Produces already serialized key and value bytes, bypassing Avro encoding"""
+        if self.raw_client is None:
+            self.raw_client = self.transport.raw_producer(self.config)
+        self.raw_client.produce(topic, value=value, key=key)
+        self.produced[topic] += 1
+        self.raw_client.poll(0)
+
+    def serializer(self, topic_name, key_schema, value_schema):
+        """Returns the cached serializer for a topic, shared by all of its producers"""
+        key = (topic_name, str(key_schema), str(value_schema))
+        serializer = self.serializers.get(key)
+        if serializer is None:
+            serializer = CachedAvroSerializer(
+                self.schema_registry, topic_name, key_schema, value_schema
+            )
+            self.serializers[key] = serializer
+        return serializer
+
+    def flush(self):
+        """Flushes all outstanding messages on the shared clients"""
+        self.client.flush()
+        if self.raw_client is not None:
+            self.raw_client.flush()
+
+    def stats(self):
+        """Returns produced, delivered and failed message counts keyed by topic"""
+        return {
+            topic: {
+                "produced": self.produced[topic],
+                "delivered": self.delivered[topic],
+                "failed": self.failed[topic],
+            }
+            for topic in self.produced
+        }
+
+    def _on_delivery(self, err, msg):
+        """Tracks delivery reports for the per-topic stats"""
+        if err is not None:
+            self.failed[msg.topic()] += 1
+            logger.error("failed to deliver message to %s: %s", msg.topic(), err)
+        else:
+            self.delivered[msg.topic()] += 1
+
+
+class ProducerPool:
+    """Process-wide pool of producers keyed by broker and schema registry config"""
+
+    _lock = threading.Lock()
+    _producers = {}
+    # Builds the clients of new pooled producers and topic provisioners
+    transport = KafkaTransport()
+
+    @classmethod
+    def acquire(cls, broker_url, schema_registry_url):
+        """Returns the shared producer for the given config, creating it if needed"""
+        key = (broker_url, schema_registry_url)
+        with cls._lock:
+            pooled = cls._producers.get(key)
+            if pooled is None:
+                logger.info("creating pooled producer for %s", broker_url)
+                pooled = PooledProducer(
+                    broker_url, schema_registry_url, ProducerPool.transport
+                )
+                cls._producers[key] = pooled
+            pooled.refcount += 1
+            return pooled
+
+    @classmethod
+    def release(cls, pooled):
+        """Releases a reference, flushing and discarding the producer on the last one"""
+        with cls._lock:
+            pooled.refcount -= 1
+            if pooled.refcount > 0:
+                return
+            cls._producers.pop((pooled.broker_url, pooled.schema_registry_url), None)
+
+        pooled.flush()
+        for topic, counts in sorted(pooled.stats().items()):
+            logger.info(
+                "topic %s: %d produced, %d delivered, %d failed",
+                topic,
+                counts["produced"],
+                counts["delivered"],
+                counts["failed"],
+            )
+
+    @classmethod
+    def stats(cls):
+        """Returns the per-topic stats of every live pooled producer"""
+        with cls._lock:
+            return {key: pooled.stats() for key, pooled in cls._producers.items()}
+
+
+class TopicProvisioner:
+    """Creates the topics of many producers with a single metadata request per broker
+
+    The cluster metadata is listed once and cached. Every call to provision then diffs the
+    requested topics against it and creates the missing ones in one create_topics batch.
+    """
+
+    timeout = 10
+
+    def __init__(self, broker_url, transport):
+        self.broker_url = broker_url
+        self.client = transport.admin({"bootstrap.servers": broker_url})
+        # topic name -> (num_partitions, num_replicas) of the topics in the cluster
+        self.cluster_topics = None
+        self.num_brokers = None
+
+    def _load_metadata(self):
+        """Lists the topics and brokers of the cluster, once"""
+        if self.cluster_topics is not None:
+            return
+        metadata = self.client.list_topics(timeout=self.timeout)
+        self.num_brokers = len(metadata.brokers)
+        self.cluster_topics = {}
+        for name, topic in metadata.topics.items():
+            partitions = list(topic.partitions.values())
+            num_replicas = len(partitions[0].replicas) if partitions else 0
+            self.cluster_topics[name] = (len(partitions), num_replicas)
+
+    def provision(self, topics):
+        """Ensures the topics exist, given as a dict of topic name to NewTopic"""
+        self._load_metadata()
+        missing = []
+        grow = []
+        check_configs = []
+        for name, topic in topics.items():
+            if name not in self.cluster_topics:
+                if topic.replication_factor > self.num_brokers:
+                    logger.warning(
+                        "topic %s wants %d replicas, but the cluster has %d brokers",
+                        name,
+                        topic.replication_factor,
+                        self.num_brokers,
+                    )
+                    topic = NewTopic(
+                        name,
+                        num_partitions=topic.num_partitions,
+                        replication_factor=self.num_brokers,
+                        config=topic.config or {},
+                    )
+                missing.append(topic)
+                continue
+
+            num_partitions, num_replicas = self.cluster_topics[name]
+            if num_partitions < topic.num_partitions:
+                grow.append(NewPartitions(name, topic.num_partitions))
+            if num_replicas != topic.replication_factor:
+                logger.warning(
+                    "topic %s has %d replicas instead of %d",
+                    name,
+                    num_replicas,
+                    topic.replication_factor,
+                )
+            if topic.config:
+                check_configs.append(topic)
+
+        if missing:
+            self._wait(self.client.create_topics(missing), "create topic")
+            for topic in missing:
+                self.cluster_topics[topic.topic] = (
+                    topic.num_partitions,
+                    topic.replication_factor,
+                )
+        if grow:
+            self._wait(self.client.create_partitions(grow), "add partitions to topic")
+            for new_partitions in grow:
+                _, num_replicas = self.cluster_topics[new_partitions.topic]
+                self.cluster_topics[new_partitions.topic] = (
+                    new_partitions.new_total_count,
+                    num_replicas,
+                )
+        if check_configs:
+            self._check_configs(check_configs)
+
+        logger.info(
+            "provisioned %d topics: %d created, %d with partitions added",
+            len(topics),
+            len(missing),
+            len(grow),
+        )
+
+    def _check_configs(self, topics):
+        """Warns about existing topics whose configs differ from the requested ones"""
+        resources = {
+            topic.topic: ConfigResource(ConfigResource.Type.TOPIC, topic.topic)
+            for topic in topics
+        }
+        futures = self.client.describe_configs(list(resources.values()))
+        for topic in topics:
+            configs = futures[resources[topic.topic]].result(timeout=self.timeout)
+            for key, value in topic.config.items():
+                actual = configs[key].value if key in configs else None
+                if actual != str(value):
+                    logger.warning(
+                        "topic %s has %s=%s instead of %s", topic.topic, key, actual, value
+                    )
+
+    def _wait(self, futures, action):
+        """Waits on a batch of admin futures, tolerating topics that already exist"""
+        for topic_name, future in futures.items():
+            try:
+                future.result()
+                logger.info("%s succeeded: %s", action, topic_name)
+            except KafkaException as e:
+                # Worker processes provision concurrently, so another may have won
+                if e.args[0].code() == KafkaError.TOPIC_ALREADY_EXISTS:
+                    logger.info("topic %s already exists", topic_name)
+                    continue
+                logger.error("%s failed: %s", action, e)
+                raise
+
+
 class Producer:
     """Defines and provides common functionality amongst Producers"""
 
     # Tracks existing topics across all Producer instances
     existing_topics = set([])
+    # Topics requested by Producer instances that are not provisioned yet, by broker
+    pending_topics = collections.defaultdict(dict)
+    provisioners = {}
 
     def __init__(
             self,
@@ -23,6 +275,7 @@ class Producer:
             value_schema=None,
             num_partitions=1,
             num_replicas=1,
+            topic_config=None,
     ):
         """Initializes a Producer object with basic settings"""
         self.topic_name = topic_name
@@ -37,47 +290,73 @@ class Producer:
             "SCHEMA_REGISTRY_URL": "http://localhost:8081"
         }
 
-        # If the topic does not already exist, try to create it
+        # If the topic does not already exist, queue it for the next provision_topics.
+        # Producers that nobody provisions in bulk create it on their first message
         if self.topic_name not in Producer.existing_topics:
-            self.create_topic()
-            Producer.existing_topics.add(self.topic_name)
-
-        # Config AvroProducer
+            Producer.pending_topics[self.broker_properties["BROKER_URL"]][
+                self.topic_name
+            ] = NewTopic(
+                topic=self.topic_name,
+                num_partitions=self.num_partitions,
+                replication_factor=self.num_replicas,
+                config=topic_config or {},
+            )
 
-        self.producer = AvroProducer(
-            {'bootstrap.servers': self.broker_properties["BROKER_URL"]},  # for docker -> 29092
-            schema_registry=CachedSchemaRegistryClient(
-                {"url": self.broker_properties['SCHEMA_REGISTRY_URL']}),
-            default_key_schema=key_schema,
-            default_value_schema=value_schema
+        # Share one AvroProducer amongst all producers with the same configuration
+        self.producer = ProducerPool.acquire(
+            self.broker_properties["BROKER_URL"],
+            self.broker_properties["SCHEMA_REGISTRY_URL"],
         )
+        self._serializer = None
+        self._provisioned = False
 
-    def create_topic(self):
-        """Creates the producer topic if it does not already exist"""
-        client = AdminClient({"bootstrap.servers": self.broker_properties['BROKER_URL']})
+    @property
+    def serializer(self):
+        """The cached Avro serializer for this producer's topic and schemas"""
+        if self._serializer is None:
+            self._serializer = self.producer.serializer(
+                self.topic_name, self.key_schema, self.value_schema
+            )
+        return self._serializer
 
-        # creates the topic
-        topic = NewTopic(
-            topic=self.topic_name,
-            num_partitions=self.num_partitions,
-            replication_factor=self.num_replicas,
-        )
+    def ensure_topic(self):
+        """Provisions the pending topics if this producer's topic is one of them"""
+        if self._provisioned:
+            return
+        if self.topic_name not in Producer.existing_topics:
+            logger.info("provisioning topic %s on its first message", self.topic_name)
+            Producer.provision_topics()
+        if self.topic_name not in Producer.existing_topics:
+            logger.warning("producing to topic %s, which was never provisioned", self.topic_name)
+        self._provisioned = True
 
-        topics = client.create_topics([topic])
+    def produce(self, **kwargs):
+        """Produces an Avro message on the shared producer, provisioning the topic first"""
+        self.ensure_topic()
+        self.producer.produce(**kwargs)
 
-        for topic_name, topic in topics.items():
-            try:
-                topic.result()
-                print(f"create topic succeed: {topic_name}")
-            except Exception as e:
-                print(f"create topic fail: {e}")
-                raise
+    def produce_raw(self, topic, key, value):
+        """Produces pre-encoded bytes on the shared producer, provisioning the topic first"""
+        self.ensure_topic()
+        self.producer.produce_raw(topic, key, value)
 
-        logger.info("topic creation kafka integration complete")
+    @classmethod
+    def provision_topics(cls):
+        """Creates the topics of every Producer built since the last call, in bulk"""
+        for broker_url, topics in cls.pending_topics.items():
+            if not topics:
+                continue
+            provisioner = cls.provisioners.get(broker_url)
+            if provisioner is None:
+                provisioner = TopicProvisioner(broker_url, ProducerPool.transport)
+                cls.provisioners[broker_url] = provisioner
+            provisioner.provision(topics)
+            cls.existing_topics.update(topics)
+            topics.clear()
 
     def close(self):
-        """Prepares the producer for exit by cleaning up the producer"""
-        self.producer.flush()
+        """Prepares the producer for exit by releasing the shared producer"""
+        ProducerPool.release(self.producer)
         logger.info("producer close complete")
 
     @staticmethod
@@ -0,0 +1,93 @@
+"""Client for producing Avro records through the Confluent REST Proxy"""
+import json
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+
+class RestProxyClient:
+    """Posts Avro records for a topic over a pooled keep-alive session
+
+    The key and value schemas are sent in full until the first successful post, after
+    which the schema ids the REST Proxy returned are sent in their place. Records are
+    buffered and posted batch_size at a time, or once the oldest has waited max_age
+    seconds, whichever comes first. Callers that send rarely call flush_expired
+    periodically so a record is not held until the next send.
+    """
+
+    content_type = "application/vnd.kafka.avro.v2+json"
+
+    def __init__(
+        self, url, topic_name, key_schema, value_schema, batch_size=1, max_age=None
+    ):
+        self.topic_url = f"{url}/topics/{topic_name}"
+        self.key_schema = json.dumps(key_schema)
+        self.value_schema = json.dumps(value_schema)
+        self.key_schema_id = None
+        self.value_schema_id = None
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.records = []
+        # Monotonic time the oldest buffered record was sent at
+        self.oldest = None
+
+        self.session = requests.Session()
+        self.session.headers["Content-Type"] = RestProxyClient.content_type
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send(self, key, value):
+        """Buffers a record, posting the buffer once it is full or its oldest record expired"""
+        if not self.records:
+            self.oldest = time.monotonic()
+        self.records.append({"key": key, "value": value})
+        if len(self.records) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_expired()
+
+    def flush_expired(self):
+        """Posts the buffer if its oldest record has waited longer than max_age seconds"""
+        if (
+            self.records
+            and self.max_age is not None
+            and time.monotonic() - self.oldest >= self.max_age
+        ):
+            self.flush()
+
+    def flush(self):
+        """Posts every buffered record in a single request"""
+        if not self.records:
+            return
+        payload = {"records": self.records}
+        if self.key_schema_id is None:
+            payload["key_schema"] = self.key_schema
+            payload["value_schema"] = self.value_schema
+        else:
+            payload["key_schema_id"] = self.key_schema_id
+            payload["value_schema_id"] = self.value_schema_id
+
+        resp = self.session.post(self.topic_url, data=json.dumps(payload))
+        resp.raise_for_status()
+        self.records = []
+
+        if self.key_schema_id is None:
+            body = resp.json()
+            self.key_schema_id = body.get("key_schema_id")
+            self.value_schema_id = body.get("value_schema_id")
+            # Keep sending the schemas if the proxy did not return both ids
+            if self.key_schema_id is None or self.value_schema_id is None:
+                self.key_schema_id = self.value_schema_id = None
+
+    def close(self):
+        """Posts any buffered records and closes the session"""
+        try:
+            self.flush()
+        finally:
+            self.session.close()
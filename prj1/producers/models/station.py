@@ -17,7 +17,16 @@ class Station(Producer):
     key_schema = avro.load(f"{Path(__file__).parents[0]}/schemas/arrival_key.json")
     value_schema = avro.load(f"{Path(__file__).parents[0]}/schemas/arrival_value.json")
 
-    def __init__(self, station_id, name, color, direction_a=None, direction_b=None):
+    def __init__(
+        self,
+        station_id,
+        name,
+        color,
+        direction_a=None,
+        direction_b=None,
+        aggregate_turnstiles=False,
+        month_beginning=None,
+    ):
         """
         Initializes the Station instance.
 
@@ -27,6 +36,8 @@ class Station(Producer):
             color (str): The color of the line this station belongs to.
             direction_a (Direction, optional): The direction A (optional).
             direction_b (Direction, optional): The direction B (optional).
+            aggregate_turnstiles (bool, optional): Emit aggregated turnstile records.
+            month_beginning (date, optional): The month of seed ridership for the turnstile.
         """
         # Prepare the station name and Kafka topic name by sanitizing the station name
         station_name = (
@@ -37,7 +48,8 @@ class Station(Producer):
             .replace("'", "")
         )
 
-        topic_name = f"org.chicago.cta.{station_name}.arrivals.v1"
+        # Matches the "^org.chicago.cta.station.arrivals." subscription of the dashboard
+        topic_name = f"org.chicago.cta.station.arrivals.{station_name}"
 
         # Initialize the producer (inherited from Producer class)
         super().__init__(
@@ -56,7 +68,9 @@ class Station(Producer):
         self.dir_b = direction_b
         self.a_train = None
         self.b_train = None
-        self.turnstile = Turnstile(self)  # Initialize Turnstile for this station
+        self.turnstile = Turnstile(
+            self, aggregate=aggregate_turnstiles, month_beginning=month_beginning
+        )  # Initialize Turnstile for this station
 
     def run(self, train, direction, prev_station_id, prev_direction):
         """
@@ -71,7 +85,7 @@ class Station(Producer):
         logger.info("Arrival Kafka integration incomplete.")
         try:
             # Produce a Kafka message for the train arrival
-            self.producer.produce(
+            self.produce(
                 topic=self.topic_name,
                 key={"timestamp": self.time_millis()},
                 key_schema=self.key_schema,
@@ -0,0 +1,28 @@
+"""Transports build the Kafka clients used by the producers"""
+from confluent_kafka import Producer
+from confluent_kafka.admin import AdminClient
+from confluent_kafka.avro import AvroProducer, CachedSchemaRegistryClient
+
+
+class KafkaTransport:
+    """Builds confluent-kafka clients that talk to a real broker and schema registry
+
+    Another transport, such as an in-memory broker, can be installed on ProducerPool to
+    run the producers without Kafka. It must provide the same four methods.
+    """
+
+    def schema_registry(self, url):
+        """Returns the schema registry client for url"""
+        return CachedSchemaRegistryClient({"url": url})
+
+    def producer(self, config, schema_registry):
+        """Returns an AvroProducer-compatible client"""
+        return AvroProducer(config, schema_registry=schema_registry)
+
+    def raw_producer(self, config):
+        """Returns a Producer-compatible client for already serialized keys and values"""
+        return Producer(config)
+
+    def admin(self, config):
+        """Returns an AdminClient-compatible client"""
+        return AdminClient(config)
@@ -16,56 +16,114 @@ class Turnstile(Producer):
     # Load Avro schemas for Kafka messages
     key_schema = avro.load(f"{Path(__file__).parents[0]}/schemas/turnstile_key.json")
     value_schema = avro.load(f"{Path(__file__).parents[0]}/schemas/turnstile_value.json")
+    aggregate_value_schema = avro.load(
+        f"{Path(__file__).parents[0]}/schemas/turnstile_value_v2.json"
+    )
 
-    def __init__(self, station):
+    def __init__(self, station, aggregate=False, month_beginning=None):
         """
         Initializes the Turnstile producer for the given station.
 
         Args:
             station (Station): The station object associated with the turnstile.
+            aggregate (bool, optional): Emit one record per tick carrying the entry count
+                instead of one record per entry. Defaults to False.
+            month_beginning (date, optional): The month whose seed ridership drives the
+                turnstile. Defaults to the latest month available for the station.
         """
-        # Use a static topic for all stations (no change per station)
-        topic_name = "org.chicago.cta.station.turnstile.v1"  # Static topic for all stations
+        self.aggregate = aggregate
+
+        # Use a static topic for all stations (no change per station). Aggregated records
+        # use a different value schema, so they are published to their own versioned topic
+        if aggregate:
+            topic_name = "org.chicago.cta.station.turnstile.v2"
+            value_schema = Turnstile.aggregate_value_schema
+        else:
+            topic_name = "org.chicago.cta.station.turnstile.v1"
+            value_schema = Turnstile.value_schema
 
         # Initialize the producer (inherited from Producer class)
         super().__init__(
             topic_name=topic_name,
             key_schema=Turnstile.key_schema,
-            value_schema=Turnstile.value_schema,
+            value_schema=value_schema,
             num_partitions=6,  # Increase number of partitions for better load distribution
             num_replicas=3     # Increase number of replicas for better fault tolerance and data durability
         )
 
         # Store the station and turnstile hardware references
         self.station = station
-        self.turnstile_hardware = TurnstileHardware(station)
+        self.turnstile_hardware = TurnstileHardware(station, month_beginning)
 
-    def run(self, timestamp, time_step):
+    def run(self, timestamp, time_step, num_entries=None):
         """
         Simulates riders entering through the turnstile at a given timestamp and time step.
-        Publishes the entries to Kafka.
+        Publishes the entries to Kafka, either one record per entry or, in aggregate mode,
+        one record per tick.
 
         Args:
             timestamp (int): The timestamp of the data being processed.
             time_step (int): The time step that defines the period of data simulation.
+            num_entries (int, optional): Precomputed entries for this tick, for example from a
+                TurnstileBank. Drawn from the turnstile hardware when not given.
         """
-        num_entries = self.turnstile_hardware.get_entries(timestamp, time_step)
-
-        # Produce Kafka messages for each entry detected by the turnstile hardware
-        for _ in range(num_entries):
-            try:
-                self.producer.produce(
-                    topic=self.topic_name,
-                    key_schema=self.key_schema,
-                    key={"timestamp": self.time_millis()},
-                    value_schema=self.value_schema,
-                    value={
-                        "station_id": self.station.station_id,
-                        "station_name": self.station.name,
-                        "line": self.station.color.name
-                    },
+        if num_entries is None:
+            num_entries = self.turnstile_hardware.get_entries(timestamp, time_step)
+
+        if self.aggregate:
+            self._produce_aggregate(num_entries)
+            return
+
+        # Produce Kafka messages for each entry detected by the turnstile hardware. The value is
+        # identical for every entry at this station, so it is encoded once and reused
+        if num_entries <= 0:
+            return
+
+        try:
+            value = self.serializer.encode_value(
+                {
+                    "station_id": self.station.station_id,
+                    "station_name": self.station.name,
+                    "line": self.station.color.name
+                },
+                # Stations served by several lines share an id, so the line is part of the key
+                cache_key=(self.station.station_id, self.station.color.name),
+            )
+            for _ in range(num_entries):
+                self.produce_raw(
+                    self.topic_name,
+                    key=self.serializer.encode_timestamp_key(self.time_millis()),
+                    value=value,
                 )
-            except Exception as e:
-                # Log the error and raise the exception
-                logger.critical(f"Error producing turnstile data: {e}")
-                raise e
+        except Exception as e:
+            # Log the error and raise the exception
+            logger.critical(f"Error producing turnstile data: {e}")
+            raise e
+
+    def _produce_aggregate(self, num_entries):
+        """
+        Publishes a single record carrying the number of entries for this tick.
+
+        Args:
+            num_entries (int): The number of entries detected during the tick.
+        """
+        if num_entries <= 0:
+            return
+
+        try:
+            self.produce(
+                topic=self.topic_name,
+                key_schema=self.key_schema,
+                key={"timestamp": self.time_millis()},
+                value_schema=self.value_schema,
+                value={
+                    "station_id": self.station.station_id,
+                    "station_name": self.station.name,
+                    "line": self.station.color.name,
+                    "num_entries": num_entries,
+                },
+            )
+        except Exception as e:
+            # Log the error and raise the exception
+            logger.critical(f"Error producing aggregated turnstile data: {e}")
+            raise e
@@ -0,0 +1,50 @@
+"""Vectorized turnstile entry generation for all stations on a line"""
+import logging
+
+import numpy as np
+
+from models.turnstile_hardware import TurnstileHardware
+
+
+logger = logging.getLogger(__name__)
+
+
+class TurnstileBank:
+    """Computes the turnstile entries of many stations with a single NumPy expression"""
+
+    def __init__(self, stations, month_beginning=None, seed=None):
+        """Precomputes the ridership of every station and the hourly ridership ratios"""
+        self.stations = stations
+        TurnstileHardware._load_data()
+        # Rows are station positions, columns are weekday, saturday and sunday ridership
+        self.ridership = np.array(
+            [
+                TurnstileHardware.ridership(station.station_id, month_beginning)
+                for station in stations
+            ],
+            dtype=np.int64,
+        ).reshape(len(stations), 3)
+        self.hour_ratios = np.array(TurnstileHardware.hour_ratios)
+
+        self.rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def day_type(timestamp):
+        """Returns the ridership column for the day: weekday, saturday or sunday"""
+        dow = timestamp.weekday()
+        if dow < 5:
+            return 0
+        elif dow == 5:
+            return 1
+        return 2
+
+    def get_entries(self, timestamp, time_step):
+        """Returns an array with the number of turnstile entries of every station"""
+        ratio = self.hour_ratios[timestamp.hour]
+        total_steps = int(60 / (60 / time_step.total_seconds()))
+        num_riders = self.ridership[:, TurnstileBank.day_type(timestamp)]
+
+        # Approximate the entries for this simulation step and introduce some randomness
+        num_entries = np.floor(num_riders * ratio / total_steps).astype(np.int64)
+        noise = self.rng.integers(-5, 5, size=len(num_entries))
+        return np.maximum(num_entries + noise, 0)
@@ -1,8 +1,11 @@
+import bisect
+import datetime
 import logging
 import math
 from pathlib import Path
 import random
 
+import numpy as np
 import pandas as pd
 
 
@@ -10,50 +13,97 @@ logger = logging.getLogger(__name__)
 
 
 class TurnstileHardware:
+    curve_path = f"{Path(__file__).parents[1]}/data/ridership_curve.csv"
+    seed_path = f"{Path(__file__).parents[1]}/data/ridership_seed.csv"
+
     curve_df = None
     seed_df = None
 
-    def __init__(self, station):
+    # Ridership ratio for each hour of the day
+    hour_ratios = None
+    # station_id -> month_beginning -> (weekday, saturday, sunday) ridership
+    seed_index = None
+    # station_id -> sorted list of the months available for the station
+    seed_months = None
+
+    def __init__(self, station, month_beginning=None):
         """Create the Turnstile"""
         self.station = station
         TurnstileHardware._load_data()
-        self.metrics_df = TurnstileHardware.seed_df[
-            TurnstileHardware.seed_df["station_id"] == station.station_id
-        ]
-        self.weekday_ridership = int(
-            round(self.metrics_df.iloc[0]["avg_weekday_rides"])
-        )
-        self.saturday_ridership = int(
-            round(self.metrics_df.iloc[0]["avg_saturday_rides"])
-        )
-        self.sunday_ridership = int(
-            round(self.metrics_df.iloc[0]["avg_sunday-holiday_rides"])
-        )
+        (
+            self.weekday_ridership,
+            self.saturday_ridership,
+            self.sunday_ridership,
+        ) = TurnstileHardware.ridership(station.station_id, month_beginning)
 
     @classmethod
     def _load_data(cls):
         if cls.curve_df is None:
-            cls.curve_df = pd.read_csv(
-                f"{Path(__file__).parents[1]}/data/ridership_curve.csv"
-            )
+            cls.curve_df = pd.read_csv(cls.curve_path)
+            cls.hour_ratios = [0.0] * 24
+            for hour, ratio in zip(
+                cls.curve_df["hour"].to_numpy(), cls.curve_df["ridership_ratio"].to_numpy()
+            ):
+                # The curve also lists hour 24, which a timestamp can never reach
+                if hour < 24:
+                    cls.hour_ratios[hour] = float(ratio)
         if cls.seed_df is None:
-            cls.seed_df = pd.read_csv(
-                f"{Path(__file__).parents[1]}/data/ridership_seed.csv"
+            cls.seed_df = pd.read_csv(cls.seed_path)
+            cls._build_seed_index()
+
+    @classmethod
+    def _build_seed_index(cls):
+        """Indexes the seed ridership by station and month for constant time lookups"""
+        months = pd.to_datetime(cls.seed_df["month_beginning"], format="%m/%d/%Y").dt.date
+        ridership = np.round(
+            cls.seed_df[
+                ["avg_weekday_rides", "avg_saturday_rides", "avg_sunday-holiday_rides"]
+            ].to_numpy()
+        ).astype(np.int64)
+
+        cls.seed_index = {}
+        for station_id, month, (weekday, saturday, sunday) in zip(
+            cls.seed_df["station_id"].tolist(), months.tolist(), ridership.tolist()
+        ):
+            # Keep the first row seen for a station and month, as the scan-based lookup did
+            cls.seed_index.setdefault(station_id, {}).setdefault(
+                month, (weekday, saturday, sunday)
             )
+        cls.seed_months = {
+            station_id: sorted(station_months)
+            for station_id, station_months in cls.seed_index.items()
+        }
+
+    @classmethod
+    def ridership(cls, station_id, month_beginning=None):
+        """Returns the (weekday, saturday, sunday) ridership of a station for a month
+
+        Uses the latest month on or before month_beginning, or the latest month of all when
+        month_beginning is not given or precedes every month available for the station.
+        """
+        cls._load_data()
+        station_months = cls.seed_index[station_id]
+        if month_beginning is not None:
+            month = datetime.date(month_beginning.year, month_beginning.month, 1)
+            if month in station_months:
+                return station_months[month]
+            available = cls.seed_months[station_id]
+            idx = bisect.bisect_right(available, month)
+            if idx > 0:
+                return station_months[available[idx - 1]]
+            logger.debug("no ridership for station %s before %s", station_id, month)
+        return station_months[cls.seed_months[station_id][-1]]
 
     def get_entries(self, timestamp, time_step):
         """Returns the number of turnstile entries for the given timeframe"""
-        hour_curve = TurnstileHardware.curve_df[
-            TurnstileHardware.curve_df["hour"] == timestamp.hour
-        ]
-        ratio = hour_curve.iloc[0]["ridership_ratio"]
+        ratio = TurnstileHardware.hour_ratios[timestamp.hour]
         total_steps = int(60 / (60 / time_step.total_seconds()))
 
         num_riders = 0
         dow = timestamp.weekday()
-        if dow >= 0 or dow < 5:
+        if dow < 5:
             num_riders = self.weekday_ridership
-        elif dow == 6:
+        elif dow == 5:
             num_riders = self.saturday_ridership
         else:
             num_riders = self.sunday_ridership
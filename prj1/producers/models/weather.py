@@ -4,11 +4,9 @@ import json
 import logging
 from pathlib import Path
 import random
-import urllib.parse
-
-import requests
 
 from models.producer import Producer
+from models.rest_proxy import RestProxyClient
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +19,10 @@ class Weather(Producer):
     )
 
     rest_proxy_url = "http://localhost:8082"
+    # Most records per REST Proxy request when several are sent within max_age
+    fast_batch_size = 10
+    # Wall clock seconds a buffered record may wait before it is posted anyway
+    max_age = 5.0
 
     key_schema = None
     value_schema = None
@@ -28,7 +30,7 @@ class Weather(Producer):
     winter_months = {0, 1, 2, 3, 10, 11}
     summer_months = {6, 7, 8}
 
-    def __init__(self, month):
+    def __init__(self, month, batch_size=1, max_age=None):
         super().__init__(
             topic_name=f"org.chicago.cta.weather.v1",
             key_schema=Weather.key_schema,
@@ -52,6 +54,16 @@ class Weather(Producer):
             with open(f"{Path(__file__).parents[0]}/schemas/weather_value.json") as f:
                 Weather.value_schema = json.load(f)
 
+        # Records are buffered batch_size at a time, for at most max_age seconds
+        self.client = RestProxyClient(
+            Weather.rest_proxy_url,
+            self.topic_name,
+            Weather.key_schema,
+            Weather.value_schema,
+            batch_size=batch_size,
+            max_age=Weather.max_age if max_age is None else max_age,
+        )
+
     def _set_weather(self, month):
         """Returns the current weather"""
         mode = 0.0
@@ -64,34 +76,23 @@ class Weather(Producer):
 
     def run(self, month):
         self._set_weather(month)
-        data = json.dumps(
-            {
-                "key_schema": json.dumps(Weather.key_schema),
-                "value_schema": json.dumps(Weather.value_schema),
-                "records": [
-                    {
-                        "key": {
-                            "timestamp": self.time_millis()
-                        },
-                        "value": {
-                            'temperature': self.temp,
-                            'status': self.status.name
-                        }
-                    }
-                ]
-            }
-        )
-
-        resp = requests.post(
-            f"{Weather.rest_proxy_url}/topics/{self.topic_name}",
-            headers={"Content-Type": "application/vnd.kafka.avro.v2+json"},
-            data=data
+        self.ensure_topic()
+        self.client.send(
+            key={"timestamp": self.time_millis()},
+            value={"temperature": self.temp, "status": self.status.name},
         )
 
-        resp.raise_for_status()
-
         logger.debug(
             "sent weather data to kafka, temp: %s, status: %s",
             self.temp,
             self.status.name,
         )
+
+    def flush_expired(self):
+        """Posts the buffered weather records once the oldest has waited max_age seconds"""
+        self.client.flush_expired()
+
+    def close(self):
+        """Posts any buffered weather records before closing the producer"""
+        self.client.close()
+        super().close()
@@ -0,0 +1,138 @@
+"""Generates synthetic train networks for load testing the simulation
+
+A network is a directory holding a station list in the format of data/cta_stations.csv, a
+ridership seed in the format of data/ridership_seed.csv and a network.json describing the
+lines and trains. Ridership is resampled from the real CTA seed, so the load each station
+generates matches that of the real system.
+
+Run from the producers directory, then pass the directory to the simulation:
+
+    python network.py --lines 30 --stations 40 --trains 20 --output /tmp/network
+    python simulation.py --network /tmp/network
+"""
+import argparse
+from enum import IntEnum
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+STATIONS_FILE = "cta_stations.csv"
+SEED_FILE = "ridership_seed.csv"
+NETWORK_FILE = "network.json"
+
+# Station ids are allocated above the range used by the real CTA stations
+FIRST_STATION_ID = 100000
+FIRST_STOP_ID = 200000
+
+
+def line_names(num_lines):
+    """Returns the names of the lines, which double as the station list columns"""
+    width = len(str(num_lines - 1))
+    return [f"line_{i:0{width}d}" for i in range(num_lines)]
+
+
+def build_stations(names, num_stations):
+    """Returns the station list, with one row per station and direction like the CTA's"""
+    rows = []
+    station_id = FIRST_STATION_ID
+    stop_id = FIRST_STOP_ID
+    for name in names:
+        for order in range(num_stations):
+            station_name = f"{name.replace('_', ' ').title()} Station {order}"
+            for direction in ("E", "W"):
+                row = {
+                    "stop_id": stop_id,
+                    "direction_id": direction,
+                    "stop_name": f"{station_name} ({direction})",
+                    "station_name": station_name,
+                    "station_descriptive_name": station_name,
+                    "station_id": station_id,
+                    "order": order,
+                }
+                row.update({line: line == name for line in names})
+                rows.append(row)
+                stop_id += 1
+            station_id += 1
+    return pd.DataFrame(rows)
+
+
+def build_seed(station_ids, real_seed_df, rng):
+    """Returns a ridership seed that resamples the real seed's rows for every station"""
+    sample = real_seed_df.iloc[rng.integers(0, len(real_seed_df), len(station_ids))]
+    seed_df = sample.reset_index(drop=True).drop(columns=["station_id", "stationame"])
+    seed_df.insert(0, "station_id", station_ids)
+    seed_df.insert(1, "stationame", [f"Station {i}" for i in station_ids])
+    return seed_df
+
+
+def generate(output_dir, num_lines, num_stations, num_trains, seed=None):
+    """Writes a network of num_lines lines of num_stations stations and num_trains trains"""
+    if num_lines < 1:
+        raise ValueError(f"a network needs at least one line, got {num_lines}")
+    if num_stations < 2:
+        raise ValueError(f"a line needs at least two stations, got {num_stations}")
+    # Trains are spread over both directions of the line, skipping the terminal stations
+    if not 1 <= num_trains <= 2 * (num_stations - 1):
+        raise ValueError(
+            f"a line of {num_stations} stations runs 1 to {2 * (num_stations - 1)} "
+            f"trains, got {num_trains}"
+        )
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    names = line_names(num_lines)
+
+    stations_df = build_stations(names, num_stations)
+    stations_df.to_csv(output_dir / STATIONS_FILE, index=False)
+
+    real_seed_df = pd.read_csv(f"{Path(__file__).parents[0]}/data/{SEED_FILE}")
+    seed_df = build_seed(stations_df["station_id"].unique(), real_seed_df, rng)
+    seed_df.to_csv(output_dir / SEED_FILE, index=False)
+
+    with open(output_dir / NETWORK_FILE, "w") as f:
+        json.dump({"lines": names, "num_trains": num_trains}, f, indent=2)
+
+    logger.info(
+        "wrote %d lines, %d stations and %d trains to %s",
+        num_lines,
+        num_lines * num_stations,
+        num_lines * num_trains,
+        output_dir,
+    )
+
+
+def load(network_dir):
+    """Returns the line colors, station list, seed path and trains per line of a network"""
+    network_dir = Path(network_dir)
+    with open(network_dir / NETWORK_FILE) as f:
+        network = json.load(f)
+    colors = IntEnum("colors", network["lines"], start=0)
+    stations_df = pd.read_csv(network_dir / STATIONS_FILE).sort_values("order")
+    return colors, stations_df, str(network_dir / SEED_FILE), network["num_trains"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a synthetic train network")
+    parser.add_argument("--lines", type=int, required=True, help="number of lines")
+    parser.add_argument(
+        "--stations", type=int, required=True, help="number of stations per line"
+    )
+    parser.add_argument(
+        "--trains", type=int, default=10, help="number of trains per line"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument(
+        "--output", required=True, help="directory to write the network to"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    generate(args.output, args.lines, args.stations, args.trains, seed=args.seed)
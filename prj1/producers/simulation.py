@@ -1,8 +1,9 @@
 """Defines a time simulation responsible for executing any registered
 producers
 """
+import argparse
+import asyncio
 import datetime
-import time
 from enum import IntEnum
 import logging
 import logging.config
@@ -13,8 +14,13 @@ import pandas as pd
 # Import logging before models to ensure configuration is picked up
 logging.config.fileConfig(f"{Path(__file__).parents[0]}/logging.ini")
 
+from clock import SimulationClock
 from connector import configure_connector
 from models import Line, Weather
+from models.producer import Producer
+from models.turnstile_hardware import TurnstileHardware
+import network
+from workers import LineWorker
 
 
 logger = logging.getLogger(__name__)
@@ -24,17 +30,37 @@ class TimeSimulation:
     weekdays = IntEnum("weekdays", "mon tue wed thu fri sat sun", start=0)
     ten_min_frequency = datetime.timedelta(minutes=10)
 
-    def __init__(self, sleep_seconds=5, time_step=None, schedule=None):
+    def __init__(
+        self,
+        sleep_seconds=5,
+        time_step=None,
+        schedule=None,
+        aggregate_turnstiles=False,
+        month_beginning=None,
+        clock_mode=SimulationClock.modes.fixed_rate,
+        dilation=1.0,
+        parallel=False,
+        network_dir=None,
+    ):
         """Initializes the time simulation"""
         self.sleep_seconds = sleep_seconds
+        self.parallel = parallel
+        self.clock_mode = clock_mode
+        self.dilation = dilation
         self.time_step = time_step
         if self.time_step is None:
             self.time_step = datetime.timedelta(minutes=self.sleep_seconds)
 
-        # Read data from disk
-        self.raw_df = pd.read_csv(
-            f"{Path(__file__).parents[0]}/data/cta_stations.csv"
-        ).sort_values("order")
+        # Read data from disk, either the CTA stations or a generated synthetic network
+        if network_dir is None:
+            colors = Line.colors
+            num_trains = 10
+            self.raw_df = pd.read_csv(
+                f"{Path(__file__).parents[0]}/data/cta_stations.csv"
+            ).sort_values("order")
+        else:
+            colors, self.raw_df, seed_path, num_trains = network.load(network_dir)
+            TurnstileHardware.seed_path = seed_path
 
         # Define the train schedule (same for all trains)
         self.schedule = schedule
@@ -49,11 +75,21 @@ class TimeSimulation:
                 TimeSimulation.weekdays.sun: {0: TimeSimulation.ten_min_frequency},
             }
 
+        # In parallel mode every line runs with its own producer in a worker process
+        line_class = LineWorker if parallel else Line
         self.train_lines = [
-            Line(Line.colors.blue, self.raw_df[self.raw_df["blue"]]),
-            Line(Line.colors.red, self.raw_df[self.raw_df["red"]]),
-            Line(Line.colors.green, self.raw_df[self.raw_df["green"]]),
+            line_class(
+                color,
+                self.raw_df[self.raw_df[color.name]],
+                num_trains=num_trains,
+                aggregate_turnstiles=aggregate_turnstiles,
+                month_beginning=month_beginning,
+            )
+            for color in colors
         ]
+        if parallel:
+            # Workers build their lines concurrently, so wait only once all are started
+            _ = [line.ready() for line in self.train_lines]
 
     def run(self):
         curr_time = datetime.datetime.utcnow().replace(
@@ -64,20 +100,97 @@ class TimeSimulation:
         configure_connector()
 
         logger.info("beginning cta train simulation")
-        weather = Weather(curr_time.month)
+        self.weather = Weather(curr_time.month, batch_size=self._weather_batch_size())
+        Producer.provision_topics()
+        clock = SimulationClock(
+            curr_time,
+            self.time_step,
+            self.sleep_seconds,
+            mode=self.clock_mode,
+            dilation=self.dilation,
+        )
         try:
-            while True:
-                logger.debug("simulation running: %s", curr_time.isoformat())
-                # Send weather on the top of the hour
-                if curr_time.minute == 0:
-                    weather.run(curr_time.month)
-                _ = [line.run(curr_time, self.time_step) for line in self.train_lines]
-                curr_time = curr_time + self.time_step
-                time.sleep(self.sleep_seconds)
+            asyncio.run(clock.run(self._tick))
         except KeyboardInterrupt as e:
             logger.info("Shutting down")
+            clock.log_stats()
             _ = [line.close() for line in self.train_lines]
+            self.weather.close()
+
+    def _weather_batch_size(self):
+        """Returns how many weather records are sent within Weather.max_age wall seconds
+
+        Weather is sent once per simulated hour. The fixed rate clock decides how many
+        wall seconds that takes, while replay runs as fast as it can, so its batches are
+        bounded by the age of their oldest record alone.
+        """
+        if self.clock_mode == SimulationClock.modes.replay:
+            return Weather.fast_batch_size
+        ticks_per_hour = datetime.timedelta(hours=1) / self.time_step
+        record_secs = ticks_per_hour * self.sleep_seconds / self.dilation
+        return max(1, min(int(Weather.max_age / record_secs), Weather.fast_batch_size))
+
+    def _tick(self, curr_time):
+        """Runs every producer for a single step of simulated time"""
+        logger.debug("simulation running: %s", curr_time.isoformat())
+        # Send weather on the top of the hour
+        if curr_time.minute == 0:
+            self.weather.run(curr_time.month)
+        else:
+            self.weather.flush_expired()
+        if self.parallel:
+            # Broadcast the tick to every worker before waiting on any of them
+            _ = [line.submit(curr_time, self.time_step) for line in self.train_lines]
+            _ = [line.wait() for line in self.train_lines]
+        else:
+            _ = [line.run(curr_time, self.time_step) for line in self.train_lines]
 
 
 if __name__ == "__main__":
-    TimeSimulation().run()
+    parser = argparse.ArgumentParser(description="Runs the CTA train simulation")
+    parser.add_argument(
+        "--aggregate-turnstiles",
+        action="store_true",
+        help="emit one turnstile record per station per tick carrying the entry count",
+    )
+    parser.add_argument(
+        "--month-beginning",
+        type=lambda value: datetime.datetime.strptime(value, "%Y-%m").date(),
+        default=None,
+        help="month (YYYY-MM) of seed ridership to simulate, defaults to the latest month",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="run ticks as fast as possible instead of at a fixed wall clock rate",
+    )
+    parser.add_argument(
+        "--dilation",
+        type=float,
+        default=1.0,
+        help="speeds up the fixed rate clock by this factor, 10 runs ten times faster",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="run each train line with its own producer in a separate worker process",
+    )
+    parser.add_argument(
+        "--network",
+        default=None,
+        help="directory of a synthetic network generated by network.py to simulate",
+    )
+    args = parser.parse_args()
+
+    TimeSimulation(
+        aggregate_turnstiles=args.aggregate_turnstiles,
+        month_beginning=args.month_beginning,
+        clock_mode=(
+            SimulationClock.modes.replay
+            if args.replay
+            else SimulationClock.modes.fixed_rate
+        ),
+        dilation=args.dilation,
+        parallel=args.parallel,
+        network_dir=args.network,
+    ).run()
@@ -0,0 +1,120 @@
+"""Runs train lines of the simulation in their own worker processes"""
+from enum import IntEnum
+import logging
+import multiprocessing
+import signal
+
+from models import Line
+from models.turnstile_hardware import TurnstileHardware
+
+
+logger = logging.getLogger(__name__)
+
+
+def _run_line(conn, color_names, color, seed_path, station_df, line_kwargs):
+    """Worker process entry point: builds the line, then runs it on every clock tick
+
+    Every reply carries the sequence number of the command it answers, 0 for the
+    ready message, so the parent can tell it from replies it never read.
+    """
+    # The parent handles Ctrl+C and asks every worker to close in turn
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    TurnstileHardware.seed_path = seed_path
+    colors = IntEnum("colors", color_names, start=0)
+    seq = 0
+    try:
+        line = Line(colors(color), station_df, **line_kwargs)
+        conn.send((seq, "ok", None))
+        while True:
+            seq, command, args = conn.recv()
+            if command == "run":
+                line.run(*args)
+                conn.send((seq, "ok", None))
+            elif command == "close":
+                line.close()
+                conn.send((seq, "ok", None))
+                return
+    except Exception as e:
+        logger.exception("line worker %s failed", color)
+        conn.send((seq, "error", repr(e)))
+    finally:
+        conn.close()
+
+
+class LineWorker:
+    """Owns a Line, and its producers, inside a dedicated process
+
+    The parent only broadcasts the clock: submit sends the tick to the worker without
+    waiting, so ticks for every worker run in parallel, and wait blocks until it is done.
+    The process is started on construction, so many workers build their lines in
+    parallel, and ready waits until this one has built its line.
+    """
+
+    def __init__(self, color, station_df, **line_kwargs):
+        self.color = color
+        self.conn, child_conn = multiprocessing.Pipe()
+        # Sequence number of the last command sent, 0 stands for the ready message
+        self.seq = 0
+        # Enum members created with the functional API do not pickle, so the worker
+        # rebuilds the colors from their names. It also uses the parent's ridership seed
+        self.process = multiprocessing.Process(
+            target=_run_line,
+            args=(
+                child_conn,
+                [member.name for member in type(color)],
+                int(color),
+                TurnstileHardware.seed_path,
+                station_df,
+                line_kwargs,
+            ),
+            name=f"line-{color.name}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def ready(self):
+        """Waits until the worker has built its line, raising if it failed"""
+        self._wait_for(0)
+        logger.info("started line worker %s (pid %s)", self.color.name, self.process.pid)
+
+    def _send(self, command, args):
+        """Sends a command to the worker and returns its sequence number"""
+        self.seq += 1
+        self.conn.send((self.seq, command, args))
+        return self.seq
+
+    def _wait_for(self, seq):
+        """Reads replies until the one to command seq, skipping those never waited on"""
+        while True:
+            try:
+                reply_seq, status, error = self.conn.recv()
+            except EOFError:
+                raise RuntimeError(f"line worker {self.color.name} exited unexpectedly")
+            if status == "error":
+                raise RuntimeError(f"line worker {self.color.name} failed: {error}")
+            if reply_seq == seq:
+                return
+
+    def submit(self, timestamp, time_step):
+        """Starts the line's work for a tick without waiting for it to finish"""
+        self._send("run", (timestamp, time_step))
+
+    def wait(self):
+        """Waits for the last command sent to the worker, raising if it failed"""
+        self._wait_for(self.seq)
+
+    def run(self, timestamp, time_step):
+        """Runs a single tick of the line and waits for it"""
+        self.submit(timestamp, time_step)
+        self.wait()
+
+    def close(self):
+        """Closes the line's producers and stops the worker"""
+        if self.process.is_alive():
+            try:
+                self._wait_for(self._send("close", None))
+            except (BrokenPipeError, RuntimeError) as e:
+                logger.error("error closing line worker %s: %s", self.color.name, e)
+        self.process.join()
+        self.conn.close()